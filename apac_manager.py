@@ -1,8 +1,11 @@
 import os
 import sys
 import shutil
+import hashlib
+import threading
 from datetime import datetime
-from typing import List, Tuple
+from collections import deque
+from typing import Iterator, List, Tuple
 
 def _caminho_data() -> str:
     if getattr(sys, 'frozen', False):
@@ -31,76 +34,507 @@ def backup_arquivo_numeracao(fp_num: str) -> None:
     except Exception as e:
         print(f"Erro ao criar backup: {e}")
 
-NUMERACOES_APAC_MEMORIA: List[str] = []
+def calcular_dv_apac(base: int) -> int:
+    """
+    Dígito verificador da APAC: resto da divisão da base (12 dígitos) por 11;
+    resto 10 vira 0.
+    """
+    dv = base % 11
+    return 0 if dv == 10 else dv
+
+
+def formatar_apac(base: int) -> str:
+    """Número APAC de 13 dígitos: base com zeros à esquerda (12) + DV."""
+    return f"{base:012d}{calcular_dv_apac(base)}"
+
+
+class PoolApac:
+    """
+    Numerações APAC disponíveis, na ordem do arquivo, guardadas como
+    intervalos contíguos da base de 12 dígitos; o DV é calculado na hora.
+
+    O arquivo de numeração traz longas sequências consecutivas, então milhões
+    de números ocupam poucos intervalos. Números que não seguem a regra do DV
+    (ou fora do padrão de 13 dígitos) ficam como itens avulsos, preservados.
+
+    consumir()/devolver() são O(1) (sempre pela frente, como a antiga lista
+    com pop(0)/insert(0)); len() é O(1).
+    """
+
+    def __init__(self, numeracoes=()):
+        # cada segmento é [inicio, fim] (bases, inclusive) ou uma string avulsa
+        self._segmentos = deque()
+        self._total = 0
+        for apac in numeracoes:
+            self.adicionar(apac)
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __bool__(self) -> bool:
+        return self._total > 0
+
+    def __iter__(self) -> Iterator[str]:
+        for seg in self._segmentos:
+            if isinstance(seg, str):
+                yield seg
+            else:
+                for base in range(seg[0], seg[1] + 1):
+                    yield formatar_apac(base)
+
+    @staticmethod
+    def _base_regular(apac: str) -> int | None:
+        if len(apac) == 13 and apac.isdigit():
+            base = int(apac[:12])
+            if calcular_dv_apac(base) == int(apac[12]):
+                return base
+        return None
+
+    def adicionar(self, apac: str) -> None:
+        """Acrescenta um número ao final do pool."""
+        base = self._base_regular(apac)
+        ultimo = self._segmentos[-1] if self._segmentos else None
+        if base is not None and isinstance(ultimo, list) and base == ultimo[1] + 1:
+            ultimo[1] = base
+        elif base is not None:
+            self._segmentos.append([base, base])
+        else:
+            self._segmentos.append(apac)
+        self._total += 1
+
+    def adicionar_intervalo(self, inicio: int, fim: int) -> None:
+        """Acrescenta ao final todas as bases de inicio a fim (inclusive)."""
+        if fim < inicio:
+            return
+        ultimo = self._segmentos[-1] if self._segmentos else None
+        if isinstance(ultimo, list) and inicio == ultimo[1] + 1:
+            ultimo[1] = fim
+        else:
+            self._segmentos.append([inicio, fim])
+        self._total += fim - inicio + 1
+
+    def consumir(self) -> str | None:
+        """Retira e devolve o primeiro número do pool (None se vazio)."""
+        if not self._segmentos:
+            return None
+        seg = self._segmentos[0]
+        if isinstance(seg, str):
+            self._segmentos.popleft()
+            apac = seg
+        else:
+            base = seg[0]
+            if base == seg[1]:
+                self._segmentos.popleft()
+            else:
+                seg[0] = base + 1
+            apac = formatar_apac(base)
+        self._total -= 1
+        return apac
+
+    def devolver(self, apac: str) -> None:
+        """Recoloca um número no início do pool."""
+        base = self._base_regular(apac)
+        primeiro = self._segmentos[0] if self._segmentos else None
+        if base is not None and isinstance(primeiro, list) and base == primeiro[0] - 1:
+            primeiro[0] = base
+        elif base is not None:
+            self._segmentos.appendleft([base, base])
+        else:
+            self._segmentos.appendleft(apac)
+        self._total += 1
+
+    def reservar(self, n: int) -> "PoolApac":
+        """
+        Retira de uma vez até n números do início do pool e os devolve como um
+        novo PoolApac, na mesma ordem. Custa O(intervalos envolvidos), não O(n).
+        """
+        reserva = PoolApac()
+        while n > 0 and self._segmentos:
+            seg = self._segmentos[0]
+            if isinstance(seg, str):
+                self._segmentos.popleft()
+                reserva._segmentos.append(seg)
+                reserva._total += 1
+                self._total -= 1
+                n -= 1
+                continue
+            qtd = min(n, seg[1] - seg[0] + 1)
+            reserva.adicionar_intervalo(seg[0], seg[0] + qtd - 1)
+            self._total -= qtd
+            n -= qtd
+            if seg[0] + qtd > seg[1]:
+                self._segmentos.popleft()
+            else:
+                seg[0] += qtd
+        return reserva
+
+    def devolver_reserva(self, reserva: "PoolApac") -> None:
+        """Recoloca no início do pool o que sobrou de uma reserva, na ordem original."""
+        for seg in reversed(reserva._segmentos):
+            primeiro = self._segmentos[0] if self._segmentos else None
+            if isinstance(seg, str):
+                self._segmentos.appendleft(seg)
+            elif isinstance(primeiro, list) and seg[1] == primeiro[0] - 1:
+                primeiro[0] = seg[0]
+            else:
+                self._segmentos.appendleft(list(seg))
+        self._total += reserva._total
+        reserva._segmentos.clear()
+        reserva._total = 0
+
+    def _localizar(self, apac: str) -> int | None:
+        base = self._base_regular(apac)
+        for i, seg in enumerate(self._segmentos):
+            if isinstance(seg, str):
+                if seg == apac:
+                    return i
+            elif base is not None and seg[0] <= base <= seg[1]:
+                return i
+        return None
+
+    def contem(self, apac: str) -> bool:
+        return self._localizar(apac) is not None
+
+    def remover(self, apac: str) -> bool:
+        """
+        Retira um número específico do pool (onde estiver). O caso comum — o
+        número é o primeiro do pool — é O(1); nos demais, O(intervalos).
+        """
+        if self._segmentos:
+            primeiro = self._segmentos[0]
+            if primeiro == apac or (isinstance(primeiro, list) and self._base_regular(apac) == primeiro[0]):
+                self.consumir()
+                return True
+
+        i = self._localizar(apac)
+        if i is None:
+            return False
+        seg = self._segmentos[i]
+        if isinstance(seg, str):
+            del self._segmentos[i]
+        else:
+            base = int(apac[:12])
+            if seg[0] == seg[1]:
+                del self._segmentos[i]
+            elif base == seg[0]:
+                seg[0] += 1
+            elif base == seg[1]:
+                seg[1] -= 1
+            else:
+                self._segmentos.insert(i + 1, [base + 1, seg[1]])
+                seg[1] = base - 1
+        self._total -= 1
+        return True
+
+    def intervalos(self) -> List[Tuple[str, str]]:
+        """(primeira, última) APAC de cada segmento, para relatórios."""
+        res = []
+        for seg in self._segmentos:
+            if isinstance(seg, str):
+                res.append((seg, seg))
+            else:
+                res.append((formatar_apac(seg[0]), formatar_apac(seg[1])))
+        return res
+
+
+NUMERACOES_APAC_MEMORIA = PoolApac()
+
+# ====================================================
+# DIÁRIO (JOURNAL) DE CONSUMO
+# ====================================================
+# Em vez de reescrever o arquivo de numeração inteiro a cada execução, cada
+# número consumido/devolvido é anexado a "<arquivo>.journal" ("C <apac>" /
+# "D <apac>"), com fsync em pequenos lotes. Na inicialização o diário é
+# reaplicado sobre o arquivo base; de tempos em tempos ele é compactado
+# (o base é regravado e o diário zerado).
+#
+# A primeira linha do diário guarda o hash do arquivo base sobre o qual ele
+# começou (a época da compactação). O diário é sempre reaplicado — "C" de
+# número ausente e "D" de número presente são ignorados —, então um base
+# alterado (numeração nova acrescentada pelo operador, ou compactação
+# interrompida logo depois de regravar o base) não devolve ao pool o que já
+# foi consumido. Quando o hash não confere, o estado reaplicado é
+# compactado na hora e o diário passa a se referir ao base atual.
+
+SUFIXO_DIARIO = ".journal"
+LOTE_FSYNC = 64
+LIMITE_COMPACTACAO = 5000
+
+
+def _caminho_diario(fp_num: str) -> str:
+    return fp_num + SUFIXO_DIARIO
+
+
+def _assinatura_base(fp_num: str) -> str:
+    if not os.path.exists(fp_num):
+        return ""
+    h = hashlib.sha1()
+    with open(fp_num, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _ler_diario(fp_num: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """(hash do base registrado no cabeçalho do diário, entradas)."""
+    fp_diario = _caminho_diario(fp_num)
+    if not os.path.exists(fp_diario):
+        return "", []
+    entradas = []
+    with open(fp_diario, "r", encoding="ascii", errors="replace") as f:
+        cabecalho = f.readline().strip()
+        assinatura = cabecalho[len("# base "):] if cabecalho.startswith("# base ") else ""
+        for linha in f:
+            partes = linha.split()
+            # linha incompleta no fim (queda no meio da gravação) é ignorada
+            if len(partes) == 2 and partes[0] in ("C", "D") and linha.endswith("\n"):
+                entradas.append((partes[0], partes[1]))
+    return assinatura, entradas
+
+
+def _aplicar_diario(pool: PoolApac, entradas: List[Tuple[str, str]]) -> None:
+    # idempotente: consumo de número ausente e devolução de número presente
+    # são ignorados
+    for op, apac in entradas:
+        if op == "C":
+            pool.remover(apac)
+        elif not pool.contem(apac):
+            pool.devolver(apac)
+
+
+class DiarioApac:
+    """Diário de consumo/devolução aberto para anexar."""
+
+    def __init__(self, fp_num: str, assinatura: str, entradas: int = 0):
+        self.caminho = _caminho_diario(fp_num)
+        self.entradas = entradas
+        self._pendentes = 0
+        if entradas:
+            self._arq = open(self.caminho, "a", encoding="ascii")
+        else:
+            self._arq = open(self.caminho, "w", encoding="ascii")
+            self._arq.write(f"# base {assinatura}\n")
+            self._sincronizar_arquivo()
+
+    def registrar(self, op: str, apac: str) -> None:
+        self._arq.write(f"{op} {apac}\n")
+        self.entradas += 1
+        self._pendentes += 1
+        if self._pendentes >= LOTE_FSYNC:
+            self.sincronizar()
+
+    def sincronizar(self) -> None:
+        if self._pendentes:
+            self._sincronizar_arquivo()
+            self._pendentes = 0
+
+    def _sincronizar_arquivo(self) -> None:
+        self._arq.flush()
+        os.fsync(self._arq.fileno())
+
+    def fechar(self) -> None:
+        if not self._arq.closed:
+            self.sincronizar()
+            self._arq.close()
+
+
+_DIARIO: DiarioApac | None = None
+
+# Pool e diário são compartilhados por todas as remessas do processo (o modo
+# lote gera várias ao mesmo tempo, em threads): toda alteração passa por aqui.
+_LOCK_POOL = threading.RLock()
+
+
+def _numeracoes_do_arquivo(fp_num: str) -> Iterator[str]:
+    with open(fp_num, 'r', encoding='latin1') as f:
+        f.readline()
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            if '-' in linha and len(linha) >= 14:
+                base, dv = linha.split('-', 1)
+                apac = base + dv[:1]
+                if len(apac) == 13 and apac.isdigit():
+                    yield apac
+            elif len(linha) >= 13 and linha.isdigit():
+                yield linha[:13]
+
 
 def _ler_numeracoes_disco(fp_num: str) -> List[str]:
-    numeracoes = []
+    return list(_ler_pool_disco(fp_num))
+
+
+def _ler_pool_disco(fp_num: str, com_diario: bool = True) -> PoolApac:
+    pool = PoolApac()
     if not os.path.exists(fp_num):
-        return []
+        return pool
 
     try:
-        with open(fp_num, 'r', encoding='latin1') as f:
-            f.readline()
-            for linha in f:
-                linha = linha.strip()
-                if not linha:
-                    continue
-                if '-' in linha and len(linha) >= 14:
-                    base, dv = linha.split('-', 1)
-                    apac = base + dv[:1]
-                    if len(apac) == 13 and apac.isdigit():
-                        numeracoes.append(apac)
-                elif len(linha) >= 13 and linha.isdigit():
-                    numeracoes.append(linha[:13])
+        for apac in _numeracoes_do_arquivo(fp_num):
+            pool.adicionar(apac)
+        if com_diario:
+            _aplicar_diario(pool, _ler_diario(fp_num)[1])
     except Exception as e:
         print(f"ERRO ao ler numerações: {e}")
 
-    return numeracoes
+    return pool
+
+
+def _gravar_base(fp_num: str, pool: PoolApac) -> None:
+    tmp = f"{fp_num}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='latin1') as f:
+        f.write("NUMERAÇÃO APAC\n")
+        for apac in pool:
+            if len(apac) == 13:
+                f.write(f"{apac[:12]}-{apac[12]}\n")
+            else:
+                f.write(f"{apac}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, fp_num)
+
+
+def compactar_numeracoes(fp_num: str) -> None:
+    """
+    Regrava o arquivo de numeração com o estado atual do pool (após backup)
+    e zera o diário.
+    """
+    global _DIARIO
+    fp_num = fp_num or NOME_ARQUIVO_NUMERACAO
+    with _LOCK_POOL:
+        if _DIARIO is not None:
+            _DIARIO.fechar()
+        backup_arquivo_numeracao(fp_num)
+        _gravar_base(fp_num, NUMERACOES_APAC_MEMORIA)
+        _DIARIO = DiarioApac(fp_num, _assinatura_base(fp_num))
+        print(f"Numerações compactadas em: {fp_num}")
 
 
 def salvar_numeracoes(fp_num: str) -> None:
-    global NUMERACOES_APAC_MEMORIA
-    try:
-        with open(fp_num, 'w', encoding='latin1') as f:
-            f.write("NUMERAÇÃO APAC\n")
-            for apac in NUMERACOES_APAC_MEMORIA:
-                if len(apac) == 13:
-                    f.write(f"{apac[:12]}-{apac[12]}\n")
-                else:
-                    f.write(f"{apac}\n")
-        print(f"Numerações salvas em: {fp_num}")
-    except Exception as e:
-        print(f"ERRO ao salvar numerações: {e}")
+    """
+    Garante em disco o consumo feito até aqui: sincroniza o diário e, se ele
+    já estiver grande, compacta. Sem diário aberto, regrava o arquivo inteiro.
+    """
+    fp_num = fp_num or NOME_ARQUIVO_NUMERACAO
+    with _LOCK_POOL:
+        try:
+            if _DIARIO is None:
+                _gravar_base(fp_num, NUMERACOES_APAC_MEMORIA)
+            elif _DIARIO.entradas >= LIMITE_COMPACTACAO:
+                compactar_numeracoes(fp_num)
+            else:
+                _DIARIO.sincronizar()
+            print(f"Numerações salvas em: {fp_num}")
+        except Exception as e:
+            print(f"ERRO ao salvar numerações: {e}")
 
 
 def inicializar_manager(fp_num: str) -> None:
-    global NUMERACOES_APAC_MEMORIA
-    backup_arquivo_numeracao(fp_num)
-    NUMERACOES_APAC_MEMORIA = _ler_numeracoes_disco(fp_num)
-    print(f"APAC Manager inicializado → {len(NUMERACOES_APAC_MEMORIA)} numerações disponíveis")
+    global NUMERACOES_APAC_MEMORIA, _DIARIO
+    fp_num = fp_num or NOME_ARQUIVO_NUMERACAO
+    with _LOCK_POOL:
+        if _DIARIO is not None:
+            _DIARIO.fechar()
+        assinatura = _assinatura_base(fp_num)
+        pool = _ler_pool_disco(fp_num, com_diario=False)
+        assinatura_diario, entradas = _ler_diario(fp_num)
+        _aplicar_diario(pool, entradas)
+        NUMERACOES_APAC_MEMORIA = pool
+        if entradas and assinatura_diario != assinatura:
+            # o base mudou desde o início do diário: grava o estado já
+            # reaplicado, para que base e diário voltem a se referir um ao outro
+            print("Arquivo de numeração alterado desde o último diário; consumo reaplicado.")
+            _DIARIO = None
+            compactar_numeracoes(fp_num)
+        else:
+            _DIARIO = DiarioApac(fp_num, assinatura, len(entradas))
+        print(f"APAC Manager inicializado → {len(NUMERACOES_APAC_MEMORIA)} numerações disponíveis")
 
 
 def consumir_apac() -> Tuple[str | None, int]:
     global NUMERACOES_APAC_MEMORIA
-    if not NUMERACOES_APAC_MEMORIA:
-        return None, 0
-    apac = NUMERACOES_APAC_MEMORIA.pop(0)
-    return apac, len(NUMERACOES_APAC_MEMORIA)
+    with _LOCK_POOL:
+        apac = NUMERACOES_APAC_MEMORIA.consumir()
+        if apac and _DIARIO is not None:
+            _DIARIO.registrar("C", apac)
+        return apac, len(NUMERACOES_APAC_MEMORIA)
 
 
 def devolver_apac(apac_num: str) -> None:
     global NUMERACOES_APAC_MEMORIA
-    NUMERACOES_APAC_MEMORIA.insert(0, apac_num)
+    with _LOCK_POOL:
+        NUMERACOES_APAC_MEMORIA.devolver(apac_num)
+        if _DIARIO is not None:
+            _DIARIO.registrar("D", apac_num)
+
+
+def reservar_apacs(n: int) -> PoolApac:
+    """Reserva até n numerações de uma vez (ver PoolApac.reservar)."""
+    with _LOCK_POOL:
+        reserva = NUMERACOES_APAC_MEMORIA.reservar(n)
+        if _DIARIO is not None:
+            for apac in reserva:
+                _DIARIO.registrar("C", apac)
+        return reserva
+
+
+def devolver_reserva(reserva: PoolApac) -> None:
+    with _LOCK_POOL:
+        if _DIARIO is not None:
+            # cada "D" vai para o início do pool: registra do último para o
+            # primeiro para que a reaplicação preserve a ordem
+            for apac in reversed(list(reserva)):
+                _DIARIO.registrar("D", apac)
+        NUMERACOES_APAC_MEMORIA.devolver_reserva(reserva)
+
+
+def apac_disponivel(apac_num: str) -> bool:
+    """True se o número ainda está no pool (não foi consumido)."""
+    with _LOCK_POOL:
+        return NUMERACOES_APAC_MEMORIA.contem(apac_num)
 
 
 def get_numeracoes_disponiveis(fp_num: str) -> List[str]:
     return _ler_numeracoes_disco(fp_num)
 
 
-def salvar_relatorio_intervalo_apac(caminho_remessa: str, primeira_apac: str, ultima_apac: str) -> None:
+# caminho -> (assinatura do arquivo e do diário, quantidade)
+_CONTAGENS: dict = {}
+
+
+def _assinatura_contagem(fp_num: str) -> tuple:
+    """(mtime, tamanho) do arquivo de numeração e do diário; None se não existe."""
+    partes = []
+    for fp in (fp_num, _caminho_diario(fp_num)):
+        try:
+            st = os.stat(fp)
+            partes.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            partes.append(None)
+    return tuple(partes)
+
+
+def contar_numeracoes_disponiveis(fp_num: str) -> int:
+    """
+    Quantidade de numerações no arquivo (já descontado o diário), sem
+    materializar a lista. O resultado fica memorizado por caminho e só é
+    recalculado quando o mtime ou o tamanho do arquivo ou do diário mudam.
+    """
+    assinatura = _assinatura_contagem(fp_num)
+    em_cache = _CONTAGENS.get(fp_num)
+    if em_cache is not None and em_cache[0] == assinatura:
+        return em_cache[1]
+    quantidade = len(_ler_pool_disco(fp_num))
+    _CONTAGENS[fp_num] = (assinatura, quantidade)
+    return quantidade
+
+
+def salvar_relatorio_intervalo_apac(caminho_remessa: str, primeira_apac: str, ultima_apac: str,
+                                    nome_arquivo: str = "intervalo_apac.txt") -> None:
     try:
         pasta = os.path.dirname(caminho_remessa)
-        arquivo = os.path.join(pasta, "intervalo_apac.txt")
+        arquivo = os.path.join(pasta, nome_arquivo)
         with open(arquivo, "w", encoding="utf-8") as f:
             f.write(f"PRIMEIRA_APAC={primeira_apac}\n")
             f.write(f"ULTIMA_APAC={ultima_apac}\n")
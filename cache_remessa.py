@@ -0,0 +1,115 @@
+"""
+Cache persistente (SQLite) dos pacientes já renderizados.
+
+Cada paciente aceito vira uma chave: o hash dos valores da sua linha do CSV
+(já normalizados por ler_csv_pacientes), do médico e da unidade resolvidos
+nas tabelas de referência, da competência, do CBO e das versões do layout
+e do próprio cache. O cache guarda, por chave, os Registros 14/06/13 já
+prontos e a APAC que eles usam.
+
+Ao refazer uma remessa depois de corrigir algumas linhas, os pacientes
+inalterados são copiados do cache com a mesma APAC; só os que mudaram são
+renderizados de novo e recebem numeração nova.
+
+As entradas de uma remessa ficam numa tabela temporária da conexão e só
+passam para o cache (confirmar) depois que a remessa foi gravada; se a
+geração falhar, descartar as joga fora. Assim o arquivo do cache não fica
+travado durante a geração (o modo lote gera várias remessas ao mesmo
+tempo sobre o mesmo cache).
+"""
+
+import hashlib
+import sqlite3
+
+from layout import VERSAO_LAYOUT
+
+# Aumentar quando a renderização mudar: invalida todas as entradas antigas
+VERSAO_CACHE = 1
+
+_SEPARADOR = "\x1f"
+_LOTE_CONSULTA = 500
+
+
+def _texto_referencia(ref):
+    return _SEPARADOR.join(f"{k}={v}" for k, v in sorted(ref.items()))
+
+
+def chaves_pacientes(df, medicos_ref, cnes_refs, competencia, cbo):
+    """Uma chave (hex) por linha de df, na ordem de df."""
+    colunas = sorted(df.columns)
+    linhas = df[colunas].astype(str).agg(_SEPARADOR.join, axis=1) if len(df) else []
+    prefixo = _SEPARADOR.join((str(VERSAO_CACHE), VERSAO_LAYOUT, str(competencia), str(cbo),
+                               _SEPARADOR.join(colunas)))
+    return [
+        hashlib.sha1(
+            _SEPARADOR.join((prefixo, _texto_referencia(med), _texto_referencia(cnes), linha)).encode("utf-8")
+        ).hexdigest()
+        for linha, med, cnes in zip(linhas, medicos_ref, cnes_refs)
+    ]
+
+
+class CacheRenderizacao:
+    """Tabela chave -> (APAC, blocos renderizados) num arquivo SQLite."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.conexao = sqlite3.connect(caminho, timeout=30)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS renderizados ("
+            " chave TEXT PRIMARY KEY,"
+            " competencia TEXT NOT NULL,"
+            " apac TEXT NOT NULL,"
+            " blocos TEXT NOT NULL,"
+            " gravado_em TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self.conexao.execute(
+            "CREATE TEMP TABLE pendentes (chave TEXT, competencia TEXT, apac TEXT, blocos TEXT)"
+        )
+        self.conexao.commit()
+
+    def buscar(self, chaves):
+        """{chave: (apac, blocos)} das chaves que estão no cache."""
+        achados = {}
+        chaves = list(chaves)
+        for i in range(0, len(chaves), _LOTE_CONSULTA):
+            parte = chaves[i:i + _LOTE_CONSULTA]
+            marcadores = ",".join("?" * len(parte))
+            for chave, apac, blocos in self.conexao.execute(
+                f"SELECT chave, apac, blocos FROM renderizados WHERE chave IN ({marcadores})", parte
+            ):
+                achados[chave] = (apac, blocos)
+        return achados
+
+    def gravar(self, entradas, competencia):
+        """Guarda (chave, apac, blocos) como pendentes até confirmar()."""
+        self.conexao.executemany(
+            "INSERT INTO temp.pendentes (chave, competencia, apac, blocos) VALUES (?, ?, ?, ?)",
+            ((chave, competencia, apac, blocos) for chave, apac, blocos in entradas)
+        )
+
+    def confirmar(self):
+        """Passa as entradas pendentes para o cache."""
+        self.conexao.execute(
+            "INSERT OR REPLACE INTO renderizados (chave, competencia, apac, blocos)"
+            " SELECT chave, competencia, apac, blocos FROM temp.pendentes"
+        )
+        self.conexao.execute("DELETE FROM temp.pendentes")
+        self.conexao.commit()
+
+    def descartar(self):
+        self.conexao.rollback()
+        self.conexao.execute("DELETE FROM temp.pendentes")
+        self.conexao.commit()
+
+    def fechar(self):
+        self.conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if tipo is not None:
+            self.descartar()
+        self.fechar()
+        return False
@@ -0,0 +1,228 @@
+"""
+Linha de comando do gerador de remessa APAC (sem interface gráfica).
+
+Uso:
+    python -m cli gerar --pacientes input/pacientes.csv --competencia 202510
+    python -m cli lote --entrada input/
+    python -m cli preflight --pacientes input/pacientes.csv
+    python -m cli validar output/oci_oftalmo_202510.txt
+    python -m cli consultar --indice data/apacs.sqlite 12345678909
+
+Não importa PySide6, podendo rodar em servidores (cron, agendador de tarefas).
+"""
+
+import os
+import sys
+import argparse
+
+from motor import DATA_DIR, INPUT_DIR, OUTPUT_DIR, processar_remessa
+from lote import processar_lote, imprimir_resumo
+from validador import validar_remessa
+import preflight
+from indice_apac import IndiceApac
+from layout import CBO_PADRAO
+
+
+def _validar_competencia(valor):
+    if not (len(valor) == 6 and valor.isdigit()):
+        raise argparse.ArgumentTypeError("Competência inválida (AAAAMM).")
+    return valor
+
+
+def _validar_versao(valor):
+    if not (len(valor) == 5 and valor[2] == "." and valor.replace(".", "").isdigit()):
+        raise argparse.ArgumentTypeError("Versão inválida (NN.NN).")
+    return valor
+
+
+def _validar_cbo(valor):
+    if not (len(valor) == 6 and valor.isdigit()):
+        raise argparse.ArgumentTypeError("CBO inválido (6 dígitos).")
+    return valor
+
+
+def _imprimir_erro(msg):
+    print(msg, file=sys.stderr)
+
+
+def _cmd_gerar(args):
+    for rotulo, fp in (
+        ("CSV de Pacientes", args.pacientes),
+        ("Numeração APAC", args.numeracao),
+        ("Médicos", args.medicos),
+        ("Estabelecimentos", args.estabelecimentos),
+    ):
+        if not os.path.isfile(fp):
+            _imprimir_erro(f"Caminho do arquivo de {rotulo} inválido: {fp}")
+            return 2
+    if args.sigtap and not os.path.isdir(args.sigtap):
+        _imprimir_erro(f"Pasta do SIGTAP inválida: {args.sigtap}")
+        return 2
+
+    os.makedirs(args.saida, exist_ok=True)
+
+    arq, total, primeira, ultima = processar_remessa(
+        args.pacientes, args.competencia, args.versao,
+        fp_num_apac=args.numeracao, fp_medicos=args.medicos, fp_estab=args.estabelecimentos,
+        notificar_erro=_imprimir_erro, pasta_saida=args.saida,
+        busca_aproximada=args.busca_aproximada, processos=args.processos,
+        tamanho_lote=args.tamanho_lote, cbo=args.cbo, pasta_sigtap=args.sigtap, fp_cache=args.cache,
+        fp_indice=args.indice
+    )
+
+    print(f"Arquivo gerado: {arq}")
+    print(f"Total APACs: {total}")
+    print(f"{primeira} → {ultima}")
+    return 0
+
+
+def _cmd_lote(args):
+    for rotulo, fp in (
+        ("Numeração APAC", args.numeracao),
+        ("Médicos", args.medicos),
+        ("Estabelecimentos", args.estabelecimentos),
+    ):
+        if not os.path.isfile(fp):
+            _imprimir_erro(f"Caminho do arquivo de {rotulo} inválido: {fp}")
+            return 2
+    if args.sigtap and not os.path.isdir(args.sigtap):
+        _imprimir_erro(f"Pasta do SIGTAP inválida: {args.sigtap}")
+        return 2
+    if not os.path.isdir(args.entrada):
+        _imprimir_erro(f"Pasta de entrada inválida: {args.entrada}")
+        return 2
+
+    os.makedirs(args.saida, exist_ok=True)
+
+    resumos = processar_lote(
+        args.entrada, args.versao, competencia_padrao=args.competencia,
+        fp_num_apac=args.numeracao, fp_medicos=args.medicos, fp_estab=args.estabelecimentos,
+        notificar_erro=_imprimir_erro, pasta_saida=args.saida,
+        busca_aproximada=args.busca_aproximada, trabalhadores=args.trabalhadores,
+        cbo=args.cbo, pasta_sigtap=args.sigtap, fp_cache=args.cache,
+        fp_indice=args.indice
+    )
+    if not resumos:
+        _imprimir_erro(f"Nenhum CSV encontrado em {args.entrada}")
+        return 2
+
+    imprimir_resumo(resumos)
+    return 1 if any(r["erro"] for r in resumos) else 0
+
+
+def _cmd_preflight(args):
+    for rotulo, fp in (
+        ("CSV de Pacientes", args.pacientes),
+        ("Médicos", args.medicos),
+        ("Estabelecimentos", args.estabelecimentos),
+    ):
+        if not os.path.isfile(fp):
+            _imprimir_erro(f"Caminho do arquivo de {rotulo} inválido: {fp}")
+            return 2
+
+    relatorio, fp_relatorio, ausentes = preflight.preflight(
+        args.pacientes, fp_medicos=args.medicos, fp_estab=args.estabelecimentos,
+        busca_aproximada=args.busca_aproximada, fp_relatorio=args.relatorio
+    )
+    preflight.imprimir_resumo(relatorio, fp_relatorio, ausentes)
+    return 1 if (relatorio["situacao"] == "ERRO").any() else 0
+
+
+def _cmd_validar(args):
+    falhou = False
+    for fp in args.arquivos:
+        if not os.path.isfile(fp):
+            _imprimir_erro(f"Arquivo de remessa inválido: {fp}")
+            return 2
+        relatorio = validar_remessa(fp)
+        relatorio.imprimir()
+        falhou = falhou or not relatorio.ok
+    return 1 if falhou else 0
+
+
+def _cmd_consultar(args):
+    if not os.path.isfile(args.indice):
+        _imprimir_erro(f"Índice de APACs inválido: {args.indice}")
+        return 2
+    with IndiceApac(args.indice) as indice:
+        atendimentos = indice.consultar(args.documento)
+    if atendimentos.empty:
+        print(f"Nenhuma APAC registrada para {args.documento}")
+        return 1
+    print(atendimentos.to_string(index=False))
+    return 0
+
+
+def _argumentos_comuns(p):
+    p.add_argument("--versao", default="03.18", type=_validar_versao, help="versão do layout (NN.NN)")
+    p.add_argument("--numeracao", default=os.path.join(DATA_DIR, "Numeração OCI.TXT"), help="arquivo de numeração APAC")
+    p.add_argument("--medicos", default=os.path.join(DATA_DIR, "medicos.csv"), help="CSV de médicos")
+    p.add_argument("--estabelecimentos", default=os.path.join(DATA_DIR, "estabelecimentos.csv"), help="CSV de estabelecimentos")
+    p.add_argument("--saida", default=OUTPUT_DIR, help="pasta de saída da remessa")
+    p.add_argument("--busca-aproximada", action="store_true",
+                   help="resolve médico/unidade pelo nome mais parecido quando não há correspondência exata")
+    p.add_argument("--cbo", default=CBO_PADRAO, type=_validar_cbo, help="CBO do profissional nos Registros 13")
+    p.add_argument("--sigtap", help="pasta com as tabelas do SIGTAP da competência, para conferir os procedimentos")
+    p.add_argument("--cache", help="arquivo SQLite do cache de pacientes renderizados: ao gerar de novo, "
+                                   "pacientes inalterados são reaproveitados com a mesma APAC")
+    p.add_argument("--indice", help="arquivo SQLite do índice de APACs por atendimento: ao gerar de novo, "
+                                    "o mesmo paciente/data/procedimento recebe a mesma APAC")
+
+
+def montar_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m cli",
+        description="Gerador de Remessa APAC - OCI Oftalmológica"
+    )
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = sub.add_parser("gerar", help="gera a remessa APAC a partir de um CSV de pacientes")
+    gerar.add_argument("--pacientes", required=True, help="CSV de pacientes")
+    gerar.add_argument("--competencia", required=True, type=_validar_competencia, help="competência (AAAAMM)")
+    _argumentos_comuns(gerar)
+    gerar.add_argument("--processos", type=int, default=1,
+                       help="processos para renderizar em paralelo (0 = todos os núcleos)")
+    gerar.add_argument("--tamanho-lote", type=int, default=None,
+                       help="lê e grava o CSV em lotes de N linhas (memória limitada, para arquivos muito grandes)")
+    gerar.set_defaults(func=_cmd_gerar)
+
+    lote = sub.add_parser("lote", help="gera uma remessa por competência a partir de todos os CSVs de uma pasta")
+    lote.add_argument("--entrada", default=INPUT_DIR, help="pasta com os CSVs de pacientes")
+    lote.add_argument("--competencia", type=_validar_competencia,
+                      help="competência (AAAAMM) para arquivos sem competência no nome nem nas datas")
+    lote.add_argument("--trabalhadores", type=int, default=None, help="threads do pool (padrão: automático)")
+    _argumentos_comuns(lote)
+    lote.set_defaults(func=_cmd_lote)
+
+    pre = sub.add_parser("preflight", help="confere o CSV de pacientes sem gerar remessa nem gastar numeração")
+    pre.add_argument("--pacientes", required=True, help="CSV de pacientes")
+    pre.add_argument("--medicos", default=os.path.join(DATA_DIR, "medicos.csv"), help="CSV de médicos")
+    pre.add_argument("--estabelecimentos", default=os.path.join(DATA_DIR, "estabelecimentos.csv"), help="CSV de estabelecimentos")
+    pre.add_argument("--busca-aproximada", action="store_true",
+                     help="considera resolvidos médico/unidade com nome parecido na tabela")
+    pre.add_argument("--relatorio", help="CSV do relatório por paciente (padrão: output/preflight_<nome>.csv)")
+    pre.set_defaults(func=_cmd_preflight)
+
+    validar = sub.add_parser("validar", help="confere larguras, sequência e cabeçalho de remessas já geradas")
+    validar.add_argument("arquivos", nargs="+", help="arquivo(s) de remessa (oci_oftalmo_AAAAMM.txt)")
+    validar.set_defaults(func=_cmd_validar)
+
+    consultar = sub.add_parser("consultar", help="mostra as APACs já atribuídas a um paciente (índice de APACs)")
+    consultar.add_argument("documento", help="CPF ou Cartão SUS do paciente")
+    consultar.add_argument("--indice", required=True, help="arquivo SQLite do índice de APACs")
+    consultar.set_defaults(func=_cmd_consultar)
+
+    return parser
+
+
+def main(argv=None):
+    args = montar_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        _imprimir_erro(f"ERRO: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
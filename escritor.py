@@ -0,0 +1,116 @@
+import os
+import uuid
+
+from utils import codificar_ascii, FIM_LINHA
+from layout import LAYOUTS, AcumuladorControle
+
+# Registro 01 tem largura fixa: 137 dados + CRLF
+TAMANHO_CABECALHO = 139
+
+# Caracteres acumulados antes de transliterar e gravar de uma vez
+TAMANHO_BUFFER = 1 << 20
+
+# Largura em bytes (com CRLF) de cada tipo de registro, pelo indicador
+LARGURAS_REGISTRO = {tipo.encode("ascii"): layout.tamanho for tipo, layout in LAYOUTS.items()}
+
+_FIM_LINHA_BYTES = FIM_LINHA.encode("ascii")
+
+
+def conferir_larguras(dados):
+    """
+    Confere se cada registro de um trecho já codificado (bytes terminados em
+    CRLF) tem a largura do seu tipo. Levanta ValueError no primeiro que não
+    tiver (caractere perdido, CRLF dentro de um campo, tipo desconhecido).
+    """
+    registros = dados.split(_FIM_LINHA_BYTES)
+    if registros[-1]:
+        raise ValueError("Trecho da remessa não termina em CRLF.")
+    for registro in registros[:-1]:
+        esperado = LARGURAS_REGISTRO.get(registro[:2])
+        if esperado != len(registro) + len(_FIM_LINHA_BYTES):
+            raise ValueError(
+                f"Registro {registro[:2].decode('ascii', 'replace')} com {len(registro) + 2} bytes "
+                f"(esperado {esperado}): {registro[:40].decode('ascii', 'replace')}..."
+            )
+
+
+class EscritorRemessa:
+    """
+    Grava a remessa em fluxo: cada registro vai direto para um arquivo
+    temporário na pasta de destino, com um Registro 01 provisório (brancos)
+    no início. Ao finalizar, o cabeçalho definitivo é gravado por cima do
+    provisório e o temporário é renomeado atomicamente para o destino.
+
+    Uso:
+        with EscritorRemessa(caminho) as esc:
+            esc.escrever(registro)
+            esc.finalizar(cabecalho)
+
+    Se sair do bloco sem finalizar (ou por exceção), o temporário é descartado
+    e o arquivo de destino não é tocado.
+
+    Os registros são acumulados em memória até TAMANHO_BUFFER caracteres e
+    então transliterados para ASCII, conferidos (largura de cada registro) e
+    gravados de uma vez. Cada trecho gravado entra também em self.controle
+    (AcumuladorControle); campo_controle() devolve o campo do cabeçalho.
+    """
+
+    def __init__(self, caminho_final):
+        self.caminho_final = caminho_final
+        pasta, nome = os.path.split(os.path.abspath(caminho_final))
+        self.caminho_tmp = os.path.join(pasta, f".{nome}.{uuid.uuid4().hex[:8]}.tmp")
+        self._buffer = []
+        self._tamanho_buffer = 0
+        self.controle = AcumuladorControle()
+        self._arq = open(self.caminho_tmp, "xb")
+        self._arq.write(b" " * (TAMANHO_CABECALHO - len(FIM_LINHA)) + FIM_LINHA.encode("ascii"))
+
+    def escrever(self, registro):
+        self._buffer.append(registro)
+        self._tamanho_buffer += len(registro)
+        if self._tamanho_buffer >= TAMANHO_BUFFER:
+            self._descarregar()
+
+    def _descarregar(self):
+        if not self._buffer:
+            return
+        dados = codificar_ascii("".join(self._buffer))
+        self._buffer.clear()
+        self._tamanho_buffer = 0
+        conferir_larguras(dados)
+        self.controle.somar(dados)
+        self._arq.write(dados)
+
+    def campo_controle(self):
+        """Campo de controle de tudo o que foi escrito até aqui."""
+        self._descarregar()
+        return self.controle.campo()
+
+    def finalizar(self, cabecalho):
+        self._descarregar()
+        dados = codificar_ascii(cabecalho)
+        if len(dados) != TAMANHO_CABECALHO:
+            raise ValueError(f"Registro 01 inválido ({len(dados)} bytes). Esperado: {TAMANHO_CABECALHO}")
+
+        self._arq.seek(0)
+        self._arq.write(dados)
+        self._arq.flush()
+        os.fsync(self._arq.fileno())
+        self._arq.close()
+        os.replace(self.caminho_tmp, self.caminho_final)
+        return self.caminho_final
+
+    def descartar(self):
+        self._buffer.clear()
+        if not self._arq.closed:
+            self._arq.close()
+        if os.path.exists(self.caminho_tmp):
+            os.remove(self.caminho_tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._arq.closed or exc_type is not None:
+            self.descartar()
+        return False
@@ -0,0 +1,131 @@
+"""
+Índice persistente (SQLite) das APACs já atribuídas a cada atendimento.
+
+O atendimento é identificado pelo paciente (CPF ou, sem CPF, Cartão SUS),
+pela data do atendimento e pelo procedimento principal. Antes de consumir
+numeração do pool, o motor procura o atendimento no índice: se ele já
+recebeu uma APAC numa geração anterior, o mesmo número é usado de novo.
+Assim, gerar outra vez o mesmo CSV (ou uma versão corrigida dele) não
+gasta a numeração fornecida pelo DATASUS.
+
+O índice também responde de imediato "qual APAC este paciente recebeu"
+(consultar; python -m cli consultar).
+
+Como no cache de renderização, as atribuições de uma remessa ficam
+pendentes numa tabela temporária e só entram no índice depois que a
+remessa foi gravada (confirmar).
+"""
+
+import sqlite3
+
+import pandas as pd
+
+_SEPARADOR = "|"
+_LOTE_CONSULTA = 500
+
+
+def _digitos(serie):
+    return serie.astype(str).str.replace(r"\D", "", regex=True)
+
+
+def chaves_atendimentos(cpfs, cartoes, datas, procedimentos):
+    """
+    Chave "paciente|data|procedimento" de cada atendimento (Series na mesma
+    ordem). O paciente é "CPF:<cpf>" ou "CNS:<cartão>"; sem nenhum dos dois
+    (ou só zeros) a chave é None e o atendimento sempre recebe APAC nova.
+    """
+    cpfs = _digitos(cpfs).str.zfill(11)
+    cartoes = _digitos(cartoes).str.zfill(15)
+    tem_cpf = cpfs.str.strip("0") != ""
+    tem_cns = cartoes.str.strip("0") != ""
+    paciente = ("CPF:" + cpfs).where(tem_cpf, "CNS:" + cartoes)
+    chaves = paciente + _SEPARADOR + datas.astype(str) + _SEPARADOR + procedimentos.astype(str)
+    return [chave if ok else None for chave, ok in zip(chaves, tem_cpf | tem_cns)]
+
+
+class IndiceApac:
+    """Tabela atendimento -> APAC num arquivo SQLite."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.conexao = sqlite3.connect(caminho, timeout=30)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS atribuicoes ("
+            " chave TEXT PRIMARY KEY,"
+            " paciente TEXT NOT NULL,"
+            " data_atendimento TEXT NOT NULL,"
+            " procedimento TEXT NOT NULL,"
+            " competencia TEXT NOT NULL,"
+            " apac TEXT NOT NULL,"
+            " gravado_em TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self.conexao.execute("CREATE INDEX IF NOT EXISTS atribuicoes_paciente ON atribuicoes (paciente)")
+        self.conexao.execute("CREATE INDEX IF NOT EXISTS atribuicoes_apac ON atribuicoes (apac)")
+        self.conexao.execute(
+            "CREATE TEMP TABLE pendentes (chave TEXT, paciente TEXT, data_atendimento TEXT,"
+            " procedimento TEXT, competencia TEXT, apac TEXT)"
+        )
+        self.conexao.commit()
+
+    def buscar(self, chaves):
+        """{chave: apac} das chaves (não None) já atribuídas."""
+        achados = {}
+        chaves = [c for c in chaves if c is not None]
+        for i in range(0, len(chaves), _LOTE_CONSULTA):
+            parte = chaves[i:i + _LOTE_CONSULTA]
+            marcadores = ",".join("?" * len(parte))
+            for chave, apac in self.conexao.execute(
+                f"SELECT chave, apac FROM atribuicoes WHERE chave IN ({marcadores})", parte
+            ):
+                achados[chave] = apac
+        return achados
+
+    def registrar(self, atribuicoes, competencia):
+        """Guarda (chave, apac) como pendentes até confirmar(); chaves None são ignoradas."""
+        self.conexao.executemany(
+            "INSERT INTO temp.pendentes (chave, paciente, data_atendimento, procedimento, competencia, apac)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            ((chave, *chave.split(_SEPARADOR, 2), competencia, apac)
+             for chave, apac in atribuicoes if chave is not None)
+        )
+
+    def confirmar(self):
+        """Passa as atribuições pendentes para o índice."""
+        self.conexao.execute(
+            "INSERT OR REPLACE INTO atribuicoes"
+            " (chave, paciente, data_atendimento, procedimento, competencia, apac)"
+            " SELECT chave, paciente, data_atendimento, procedimento, competencia, apac FROM temp.pendentes"
+        )
+        self.conexao.execute("DELETE FROM temp.pendentes")
+        self.conexao.commit()
+
+    def descartar(self):
+        self.conexao.rollback()
+        self.conexao.execute("DELETE FROM temp.pendentes")
+        self.conexao.commit()
+
+    def consultar(self, documento):
+        """
+        Atendimentos do paciente (CPF ou Cartão SUS, com ou sem pontuação), como
+        DataFrame (data_atendimento, procedimento, competencia, apac, gravado_em).
+        """
+        numero = "".join(ch for ch in str(documento) if ch.isdigit())
+        cpf, cns = numero.zfill(11), numero.zfill(15)
+        return pd.read_sql_query(
+            "SELECT paciente, data_atendimento, procedimento, competencia, apac, gravado_em"
+            " FROM atribuicoes WHERE paciente IN (?, ?) ORDER BY data_atendimento",
+            self.conexao, params=(f"CPF:{cpf}", f"CNS:{cns}")
+        )
+
+    def fechar(self):
+        self.conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if tipo is not None:
+            self.descartar()
+        self.fechar()
+        return False
@@ -0,0 +1,246 @@
+"""
+Leitura do CSV de pacientes exportado pelo sistema de agendamento.
+
+O CSV é interpretado uma única vez: a codificação (e o BOM) é detectada antes
+(o BOM no trecho inicial, UTF-8 ou latin1 conferindo o arquivo todo em
+blocos binários), os nomes de coluna são normalizados olhando só a linha de
+cabeçalho e só as colunas usadas pela remessa são carregadas, todas como
+texto (CPF, CEP e Cartão SUS não passam por float; célula vazia é "").
+Com pyarrow instalado, o parser do pyarrow é usado.
+"""
+
+import codecs
+import importlib.util
+from datetime import datetime
+
+import pandas as pd
+
+from utils import sanitize_basic, sanitize_basic_serie
+
+TAMANHO_AMOSTRA = 64 * 1024
+TAMANHO_BLOCO_DECODIFICACAO = 1 << 20
+
+# Colunas lidas do CSV (já com os nomes normalizados por renomear_coluna)
+COLUNAS_PACIENTE = (
+    "Data_Horario",
+    "Nome",
+    "Rua",
+    "Nro",
+    "Bairro",
+    "CEP",
+    "Nome_Medico_Solicitante",
+    "Nome_Unidade_Solicitante",
+    "CPF",
+    "Mae",
+    "Data_Nascimento",
+    "Sexo",
+    "Raca_Cor",
+    "CID",
+    "Cartão SUS",
+    "DDD",
+    "Contato 1",
+    "Email",
+)
+
+COLUNAS_OBRIGATORIAS = ("Data_Horario", "Data_Nascimento")
+
+PYARROW_DISPONIVEL = importlib.util.find_spec("pyarrow") is not None
+
+# Valor gravado no lugar de uma data ausente ou inválida
+DATA_INVALIDA = "00000000"
+
+
+def _converter_data_para_apac(data_str):
+    if isinstance(data_str, (datetime, pd.Timestamp)):
+        return data_str.strftime('%Y%m%d')
+    try:
+        base = str(data_str).split(" ")[0]
+        obj = datetime.strptime(base, "%d/%m/%Y")
+        return obj.strftime("%Y%m%d")
+    except Exception:
+        return DATA_INVALIDA
+
+
+def converter_datas_serie(serie):
+    """
+    _converter_data_para_apac para uma coluna inteira: um único to_datetime
+    com formato explícito (e cache, já que dias de atendimento se repetem
+    muito). O que o to_datetime não aceita — vazio, inválido, ou fora do
+    intervalo do Timestamp — passa pela regra escalar, só sobre os valores
+    distintos.
+    """
+    texto = serie.astype(str).str.split(" ", n=1).str[0]
+    datas = pd.to_datetime(texto, format="%d/%m/%Y", errors="coerce", cache=True)
+    convertidas = datas.dt.strftime("%Y%m%d").astype(object)
+    falhas = datas.isna()
+    if falhas.any():
+        restantes = serie[falhas]
+        regra = {v: _converter_data_para_apac(v) for v in restantes.unique()}
+        convertidas[falhas] = restantes.map(regra)
+    return convertidas
+
+
+def detectar_codificacao(fp):
+    """
+    Codificação do arquivo: BOM UTF-8/UTF-16 nos primeiros bytes; senão
+    UTF-8 se o arquivo inteiro decodifica como UTF-8 (conferido em blocos,
+    sem guardar o texto), ou latin1 (o padrão das exportações). Um arquivo
+    que começa em UTF-8 com acentos e depois tem bytes inválidos em UTF-8
+    (exportações concatenadas) é lido como latin1, com aviso.
+    """
+    with open(fp, "rb") as f:
+        bloco = f.read(TAMANHO_AMOSTRA)
+        if bloco.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        if bloco.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return "utf-16"
+
+        decodificador = codecs.getincrementaldecoder("utf-8")()
+        inicio = 0
+        acentos = False
+        while True:
+            try:
+                decodificador.decode(bloco, final=not bloco)
+            except UnicodeDecodeError as e:
+                if acentos or not bloco[:e.start].isascii():
+                    print(f"Aviso: {fp} tem acentos em UTF-8 e bytes inválidos em UTF-8 "
+                          f"a partir do byte {inicio + e.start}; lido como latin1.")
+                return "latin1"
+            if not bloco:
+                return "utf-8"
+            acentos = acentos or not bloco.isascii()
+            inicio += len(bloco)
+            bloco = f.read(TAMANHO_BLOCO_DECODIFICACAO)
+
+
+def estimar_linhas(fp):
+    """
+    Quantidade aproximada de pacientes (linhas menos o cabeçalho), contando
+    quebras de linha em blocos binários, sem interpretar o CSV. Serve para
+    o progresso enquanto o arquivo ainda está sendo lido; campos entre aspas
+    com quebra de linha e linhas em branco entram na conta.
+    """
+    linhas = 0
+    ultimo = b"\n"
+    with open(fp, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            linhas += bloco.count(b"\n")
+            ultimo = bloco[-1:]
+    if ultimo != b"\n":
+        linhas += 1
+    return max(0, linhas - 1)
+
+
+def renomear_coluna(col):
+    """Nome padronizado de uma coluna do cabeçalho exportado (ou o próprio nome)."""
+    if "Hor" in col:
+        return "Data_Horario"
+    elif "Mãe" in col or "MAE" in col or "MÃ£" in col:
+        return "Mae"
+    elif "Ra" in col and "Cor" in col:
+        return "Raca_Cor"
+    elif "Profissional" in col:
+        return "Nome_Medico_Solicitante"
+    elif "Unidade" in col:
+        return "Nome_Unidade_Solicitante"
+    elif "Nascimento" in col:
+        return "Data_Nascimento"
+    elif "Cart" in col and "SUS" in col:
+        return "Cartão SUS"
+    return col
+
+
+def _selecionar_colunas(cabecalho):
+    """
+    Posições a ler e seus nomes padronizados. A primeira coluna sem nome
+    (índice salvo pelo pandas) é descartada; se um nome padronizado se
+    repetir, vale a primeira ocorrência.
+    """
+    posicoes = []
+    nomes = []
+    for pos, col in enumerate(cabecalho):
+        col = str(col)
+        if pos == 0 and (col == "" or col.startswith("Unnamed")):
+            continue
+        nome = renomear_coluna(col)
+        if nome in COLUNAS_PACIENTE and nome not in nomes:
+            posicoes.append(pos)
+            nomes.append(nome)
+    return posicoes, nomes
+
+
+def _preparar(df, nomes):
+    # usecols devolve as colunas na ordem do arquivo, que é a ordem de posicoes
+    df.columns = nomes
+    df["Data_Nascimento"] = converter_datas_serie(df["Data_Nascimento"])
+    df["Data_Horario"] = converter_datas_serie(df["Data_Horario"])
+    return df
+
+
+def ler_csv_pacientes(fp, tamanho_lote=None):
+    """
+    DataFrame de pacientes com as colunas de COLUNAS_PACIENTE presentes no
+    arquivo, como texto, e as datas já convertidas para AAAAMMDD
+    (DATA_INVALIDA quando ausentes ou inválidas).
+
+    Com tamanho_lote, devolve um iterador de DataFrames de até tamanho_lote
+    linhas (índice contínuo entre os lotes), lidos sob demanda.
+    """
+    codificacao = detectar_codificacao(fp)
+    cabecalho = pd.read_csv(fp, delimiter=";", encoding=codificacao, nrows=0).columns
+    posicoes, nomes = _selecionar_colunas(cabecalho)
+
+    faltando = [c for c in COLUNAS_OBRIGATORIAS if c not in nomes]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no CSV: {', '.join(faltando)}")
+
+    opcoes = dict(delimiter=";", encoding=codificacao, usecols=posicoes, dtype=str, keep_default_na=False)
+
+    if tamanho_lote:
+        # o parser do pyarrow não lê em lotes
+        return (_preparar(df, nomes) for df in pd.read_csv(fp, chunksize=tamanho_lote, **opcoes))
+
+    df = None
+    if PYARROW_DISPONIVEL:
+        try:
+            df = pd.read_csv(fp, engine="pyarrow", **opcoes)
+        except Exception as e:
+            print(f"Aviso: leitura com pyarrow falhou ({e}); usando o parser padrão.")
+    if df is None:
+        df = pd.read_csv(fp, **opcoes)
+
+    return _preparar(df, nomes)
+
+
+# ============================
+# Colunas do DataFrame lido, conferidas em lote (motor e preflight)
+# ============================
+
+def coluna_texto(df, nome, padrao=""):
+    """Coluna sanitizada (sanitize_basic) ou, se o CSV não a tem, padrao em todas as linhas."""
+    if nome in df.columns:
+        return sanitize_basic_serie(df[nome])
+    return pd.Series(sanitize_basic(padrao), index=df.index, dtype=object)
+
+
+def cid_serie(df):
+    """CID de cada linha: maiúsculas, só letras e dígitos, até 4 caracteres."""
+    return coluna_texto(df, "CID").str.upper().str.replace(r"[\W_]", "", regex=True).str.slice(0, 4)
+
+
+def erro_datas(nasc, cons):
+    """Mensagem de erro das datas (AAAAMMDD) de um paciente; "" se estão ok."""
+    if not nasc or len(nasc) != 8 or nasc == DATA_INVALIDA:
+        return f"Data de nascimento inválida: {nasc}"
+    if not cons or len(cons) != 8 or cons == DATA_INVALIDA:
+        return f"Data de consulta inválida: {cons}"
+    return ""
+
+
+def erros_datas(nascimentos, consultas):
+    """erro_datas para colunas inteiras: uma mensagem por linha ("" = datas ok)."""
+    nasc_ok = nascimentos.str.len().eq(8) & nascimentos.ne(DATA_INVALIDA)
+    cons_ok = consultas.str.len().eq(8) & consultas.ne(DATA_INVALIDA)
+    erros = pd.Series("", index=nascimentos.index, dtype=object)
+    erros = erros.mask(~cons_ok, "Data de consulta inválida: " + consultas)
+    return erros.mask(~nasc_ok, "Data de nascimento inválida: " + nascimentos)
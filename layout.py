@@ -0,0 +1,312 @@
+"""
+Layouts de largura fixa da remessa APAC (registros 01, 06, 13 e 14).
+
+Cada registro é declarado como uma tabela de campos (campo, tipo, tamanho,
+padrão) e compilado uma única vez, na importação do módulo, em um
+montador: os deslocamentos de cada campo são calculados, os campos de
+valor fixo já ficam formatados e a largura total é conferida contra o
+tamanho esperado do registro. Uma nova versão do layout DATASUS é, assim,
+uma alteração nas tabelas abaixo, e não no código de montagem.
+
+Convenções das tabelas:
+    campo   — chave no dicionário de dados (None = campo de valor fixo)
+    tipo    — "num" (zeros à esquerda) ou "char" (espaços à direita)
+    tamanho — largura em caracteres
+    padrão  — valor usado quando o campo não vem nos dados
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils import (
+    formatar_num,
+    formatar_char,
+    sanitize_basic,
+    sanitize_basic_serie,
+    formatar_num_serie,
+    formatar_char_serie,
+    FIM_LINHA
+)
+
+VERSAO_LAYOUT = "03.18"
+
+# CBO gravado nos Registros 13 quando não é informado outro
+CBO_PADRAO = "225265"
+
+# ====================================================
+# TABELAS DE CAMPOS
+# ====================================================
+
+# Registro 01 – Cabeçalho da Remessa APAC (137 dados + CRLF)
+CAMPOS_REGISTRO_01 = [
+    (None, "num", 2, "01"),                      # 01 – Indicador
+    (None, "char", 5, "#APAC"),                  # 02 – Literal "#APAC"
+    ("competencia", "num", 6, ""),               # 03 – Competência (AAAAMM)
+    ("total_apacs", "num", 6, ""),               # 04 – Qtde APACs geradas
+    ("campo_controle", "num", 4, ""),            # 05 – Campo de controle
+    ("nome_orgao", "char", 30, ""),              # 06 – Nome órgão origem
+    ("sigla_orgao", "char", 6, ""),              # 07 – Sigla órgão origem
+    ("cgc", "num", 14, ""),                      # 08 – CGC/CPF Prestador
+    ("nome_destino", "char", 40, ""),            # 09 – Nome órgão destino
+    ("indicador_destino", "char", 1, ""),        # 10 – Indicador destino
+    ("data_geracao", "num", 8, ""),              # 11 – Data geração (AAAAMMDD)
+    ("versao", "char", 15, ""),                  # 12 – Versão
+]
+
+# Registro 06 – Laudo Geral (25 dados + CRLF)
+CAMPOS_REGISTRO_06 = [
+    (None, "num", 2, "06"),                      # 1. Indicador
+    ("competencia", "num", 6, ""),               # 2. Competência YYYYMM
+    ("apac_numero", "num", 13, ""),              # 3. Número da APAC
+    ("cid", "char", 4, ""),                      # 4. CID Principal
+]
+
+# Registro 13 – Procedimentos/Ações Realizadas (97 dados + CRLF)
+CAMPOS_REGISTRO_13 = [
+    (None, "num", 2, "13"),                      # 1. Indicador
+    ("competencia", "num", 6, ""),               # 2. Competência
+    ("apac_numero", "num", 13, ""),              # 3. APAC
+    ("cod_proc", "num", 10, ""),                 # 4. Procedimento
+    ("cbo", "num", 6, CBO_PADRAO),               # 5. CBO
+    ("qtd", "num", 7, ""),                       # 6. Quantidade
+    (None, "char", 14, ""),                      # 7. CNPJ cessão – espaços
+    (None, "char", 6, ""),                       # 8. Nº NF – espaços
+    (None, "char", 4, ""),                       # 9. CID principal – espaços
+    (None, "char", 4, ""),                       # 10. CID secundário – espaços
+    (None, "char", 3, ""),                       # 11. Serviço – espaços
+    (None, "char", 3, ""),                       # 12. Classificação – espaços
+    (None, "char", 8, ""),                       # 13. Sequência equipe – espaços
+    (None, "char", 4, ""),                       # 14. Área equipe – espaços
+    ("cnes_terceiro", "char", 7, ""),            # 15. CNES terceiro
+]
+
+# Registro 14 — Corpo da APAC (campos 1 a 48 + CRLF)
+CAMPOS_REGISTRO_14 = [
+    ("apa_corpo", "num", 2, ""),
+    ("apa_cmp", "num", 6, ""),
+    ("apa_num", "num", 13, ""),
+    ("apa_coduf", "num", 2, ""),
+    ("apa_codcnes", "num", 7, ""),
+    ("apa_pr", "num", 8, ""),
+    ("apa_dtiinval", "num", 8, ""),
+    ("apa_dtfimval", "num", 8, ""),
+    ("apa_tipate", "num", 2, ""),
+    ("apa_tipapac", "num", 1, ""),
+    ("apa_nomepcnte", "char", 30, ""),
+    ("apa_nomemae", "char", 30, ""),
+    ("apa_logpcnte", "char", 30, ""),
+    ("apa_numpcnte", "char", 5, ""),          # CORRIGIDO
+    ("apa_cplpcnte", "char", 10, ""),
+    ("apa_ceppcnte", "num", 8, ""),
+    ("apa_munpcnte", "char", 7, ""),
+    ("apa_datanascim", "num", 8, ""),
+    ("apa_sexopcnte", "char", 1, ""),
+    ("apa_nomeresp", "char", 30, ""),
+    ("apa_codprinc", "num", 10, ""),
+    ("apa_motsaida", "num", 2, ""),
+    ("apa_dtobitoalta", "char", 8, ""),
+    ("apa_nomediretor", "char", 30, ""),
+    (None, "char", 15, ""),
+    ("apa_cnsres", "num", 15, ""),
+    ("apa_cnsdir", "num", 15, ""),
+    ("apa_cidca", "char", 4, ""),
+    ("apa_npront", "char", 10, ""),
+    ("apa_codsol", "num", 7, ""),
+    ("apa_datsol", "num", 8, ""),
+    ("apa_dataut", "num", 8, ""),
+    ("apa_codemis", "char", 10, ""),
+    ("apa_carate", "num", 2, ""),
+    ("apa_apacant", "num", 13, ""),
+    ("apa_raca", "num", 2, ""),
+    ("apa_nomeresp_pcte", "char", 30, ""),
+    ("apa_nascpcnte", "num", 3, ""),
+    ("APA_etnia", "char", 4, ""),
+    ("apa_cdlogr", "num", 3, ""),
+    ("apa_bairro", "char", 30, ""),
+    ("apa_dddtelcontato", "char", 2, ""),
+    ("apa_telcontato", "char", 9, ""),        # revisar origem deste campo
+    ("apa_email", "char", 40, ""),
+    ("apa_cnsexec", "num", 15, ""),
+    ("apa_cpfpcnte", "num", 11, ""),
+    ("apa_ine", "char", 10, ""),
+    ("apa_strua", "char", 1, ""),
+]
+
+
+# ====================================================
+# COMPILAÇÃO
+# ====================================================
+
+_FORMATADORES = {"num": formatar_num, "char": formatar_char}
+_FORMATADORES_SERIE = {"num": formatar_num_serie, "char": formatar_char_serie}
+
+
+def _formatar_coluna_lote(serie, tipo, tamanho):
+    """
+    Formata uma coluna inteira e devolve uma matriz (n, tamanho) de code points.
+    A sanitização/padding roda só sobre os valores distintos da coluna (datas,
+    constantes e dados de referência se repetem muito) e o resultado é
+    espalhado para as linhas por índice.
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    texto = sanitize_basic_serie(pd.Series(unicos, dtype=object))
+    nulos = codigos < 0
+    if nulos.any():
+        # nulos (None/NaN) são sanitizados à parte: None vira "", NaN vira "nan"
+        extra = sanitize_basic_serie(serie[nulos])
+        codigos = codigos.copy()
+        codigos[nulos] = np.arange(len(texto), len(texto) + len(extra))
+        texto = pd.concat([texto, extra], ignore_index=True)
+
+    formatado = _FORMATADORES_SERIE[tipo](texto, tamanho)
+    matriz = formatado.to_numpy().astype(f"U{tamanho}").view(np.uint32).reshape(-1, tamanho)
+    return matriz[codigos]
+
+
+class Layout:
+    """
+    Registro de largura fixa compilado a partir de uma tabela de campos.
+
+    A largura é conferida aqui, uma única vez; montar() e montar_lote() não
+    repetem a checagem a cada registro.
+    """
+
+    def __init__(self, nome, campos, tamanho):
+        self.nome = nome
+        self.campos = list(campos)
+        self.tamanho = tamanho
+        self.offsets = {}
+
+        largura = sum(c[2] for c in self.campos) + len(FIM_LINHA)
+        if largura != tamanho:
+            raise ValueError(f"Registro {nome} incorreto: {largura} bytes (esperado {tamanho}).")
+
+        # Segmentos: texto fixo já formatado (str) ou (campo, tipo, tamanho, padrão).
+        # Campos fixos vizinhos são fundidos em um único trecho.
+        self._segmentos = []
+        pos = 0
+        for campo, tipo, tam, padrao in self.campos:
+            if campo is not None:
+                self.offsets[campo] = slice(pos, pos + tam)
+                self._segmentos.append((campo, tipo, tam, padrao))
+            else:
+                fixo = _FORMATADORES[tipo](padrao, tam)
+                if self._segmentos and isinstance(self._segmentos[-1], str):
+                    self._segmentos[-1] += fixo
+                else:
+                    self._segmentos.append(fixo)
+            pos += tam
+        if self._segmentos and isinstance(self._segmentos[-1], str):
+            self._segmentos[-1] += FIM_LINHA
+        else:
+            self._segmentos.append(FIM_LINHA)
+
+    def fatia(self, campo):
+        """Posição (slice) do campo dentro do registro."""
+        return self.offsets[campo]
+
+    def montar(self, dados):
+        """Monta um registro a partir de um dicionário de dados."""
+        partes = []
+        for seg in self._segmentos:
+            if isinstance(seg, str):
+                partes.append(seg)
+            else:
+                campo, tipo, tam, padrao = seg
+                partes.append(_FORMATADORES[tipo](sanitize_basic(dados.get(campo, padrao)), tam))
+        return "".join(partes)
+
+    def montar_lote(self, df_dados):
+        """
+        Monta um registro por linha de df_dados. Cada coluna é formatada de uma
+        vez e gravada na sua fatia de uma matriz (n x tamanho), lida de volta
+        como strings. Saída idêntica a montar() linha a linha.
+        Retorna uma Series de registros (mesmo índice de df_dados).
+        """
+        n = len(df_dados)
+        matriz = np.empty((n, self.tamanho), dtype=np.uint32)
+
+        pos = 0
+        for seg in self._segmentos:
+            if isinstance(seg, str):
+                matriz[:, pos:pos + len(seg)] = [ord(c) for c in seg]
+                pos += len(seg)
+                continue
+            campo, tipo, tam, padrao = seg
+            if campo in df_dados.columns:
+                serie = df_dados[campo]
+            else:
+                serie = pd.Series(padrao, index=df_dados.index, dtype=object)
+            matriz[:, pos:pos + tam] = _formatar_coluna_lote(serie, tipo, tam)
+            pos += tam
+
+        registros = matriz.view(f"U{self.tamanho}").reshape(n).tolist()
+        return pd.Series(registros, index=df_dados.index, dtype=object)
+
+
+LAYOUT_REGISTRO_01 = Layout("01", CAMPOS_REGISTRO_01, 139)
+LAYOUT_REGISTRO_06 = Layout("06", CAMPOS_REGISTRO_06, 27)
+LAYOUT_REGISTRO_13 = Layout("13", CAMPOS_REGISTRO_13, 99)
+LAYOUT_REGISTRO_14 = Layout("14", CAMPOS_REGISTRO_14, 535)
+
+LAYOUTS = {
+    "01": LAYOUT_REGISTRO_01,
+    "06": LAYOUT_REGISTRO_06,
+    "13": LAYOUT_REGISTRO_13,
+    "14": LAYOUT_REGISTRO_14,
+}
+
+
+# ============================
+# Campo de controle do Registro 01, calculado sobre os bytes gravados
+# ============================
+
+_FATIA_APAC = LAYOUT_REGISTRO_14.fatia("apa_num")
+_FATIA_COD = LAYOUT_REGISTRO_13.fatia("cod_proc")
+_FATIA_QTD = LAYOUT_REGISTRO_13.fatia("qtd")
+_TIPO_13 = ord("1") * 256 + ord("3")
+_TIPO_14 = ord("1") * 256 + ord("4")
+
+
+def campo_bytes(a, inicios, fatia):
+    """Matriz (n, largura) com os bytes do campo em cada registro (inícios relativos a a)."""
+    return a[inicios[:, None] + np.arange(fatia.start, fatia.stop)]
+
+
+def numeros_campo(matriz):
+    """Valores dos campos numéricos (matriz de bytes) e máscara dos que têm só dígitos."""
+    digitos = matriz.astype(np.int64) - 48
+    validos = ((digitos >= 0) & (digitos <= 9)).all(axis=1)
+    potencias = 10 ** np.arange(matriz.shape[1] - 1, -1, -1, dtype=np.int64)
+    return np.where(validos, np.clip(digitos, 0, 9) @ potencias, 0), validos
+
+
+class AcumuladorControle:
+    """
+    Campo de controle do Registro 01 (regra do DATASUS) somado em fluxo:
+    número de cada APAC (Registro 14) mais código e quantidade de cada
+    Registro 13, módulo 1111; campo() devolve resto + 1111. Usado pelo
+    escritor enquanto grava e pelo validador enquanto lê a remessa.
+    """
+
+    def __init__(self):
+        self.soma = 0
+
+    def somar_numeros(self, valores):
+        self.soma = (self.soma + int((valores % 1111).sum())) % 1111
+
+    def somar(self, dados):
+        """Soma um trecho de registros completos (bytes terminados em CRLF)."""
+        a = np.frombuffer(dados, dtype=np.uint8)
+        if not len(a):
+            return
+        finais = np.flatnonzero((a[:-1] == 13) & (a[1:] == 10))
+        inicios = np.concatenate(([0], finais[:-1] + 2))
+        tipos = a[inicios].astype(np.int64) * 256 + a[inicios + 1]
+        ini_13 = inicios[tipos == _TIPO_13]
+        self.somar_numeros(numeros_campo(campo_bytes(a, inicios[tipos == _TIPO_14], _FATIA_APAC))[0])
+        self.somar_numeros(numeros_campo(campo_bytes(a, ini_13, _FATIA_COD))[0])
+        self.somar_numeros(numeros_campo(campo_bytes(a, ini_13, _FATIA_QTD))[0])
+
+    def campo(self):
+        return f"{self.soma + 1111:04d}"
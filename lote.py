@@ -0,0 +1,150 @@
+"""
+Modo lote: gera as remessas de todos os CSVs de pacientes de uma pasta.
+
+Os CSVs são agrupados por competência e cada competência vira uma remessa
+(oci_oftalmo_<competencia>.txt), como no fechamento do mês. Leitura dos
+arquivos e geração das remessas rodam num pool de threads; todas as
+remessas compartilham as mesmas tabelas de referência (carregadas uma
+vez) e o mesmo pool de numeração APAC.
+
+A competência de cada arquivo vem, nesta ordem, de um AAAAMM no nome do
+arquivo, do mês mais frequente em Data_Horario ou da competência padrão.
+"""
+
+import os
+import re
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from motor import DATA_DIR, INPUT_DIR, ler_csv_pacientes, gerar_remessa
+from apac_manager import inicializar_manager
+from referencias import carregar_referencias
+from sigtap import carregar_sigtap
+from layout import CBO_PADRAO
+
+_RE_COMPETENCIA = re.compile(r"(?<!\d)(20\d{2}(?:0[1-9]|1[0-2]))(?!\d)")
+
+
+def listar_csvs(pasta):
+    """CSVs da pasta (sem subpastas), em ordem alfabética."""
+    return sorted(
+        os.path.join(pasta, nome) for nome in os.listdir(pasta)
+        if nome.lower().endswith(".csv") and os.path.isfile(os.path.join(pasta, nome))
+    )
+
+
+def detectar_competencia(fp, df, padrao=None):
+    """AAAAMM do nome do arquivo, senão o mês mais frequente dos atendimentos, senão padrao."""
+    achado = _RE_COMPETENCIA.search(os.path.basename(fp))
+    if achado:
+        return achado.group(1)
+    if "Data_Horario" in df.columns:
+        # Data_Horario já vem convertida para AAAAMMDD ("00000000" se inválida)
+        meses = df["Data_Horario"].astype(str).str[:6]
+        meses = meses[meses.str.match(r"^20\d{2}(0[1-9]|1[0-2])$")]
+        if len(meses):
+            return meses.value_counts().index[0]
+    return padrao
+
+
+def _ler_arquivo(fp, competencia_padrao):
+    try:
+        df = ler_csv_pacientes(fp)
+        return fp, df, detectar_competencia(fp, df, competencia_padrao), ""
+    except Exception as e:
+        return fp, None, None, str(e)
+
+
+def processar_lote(pasta_entrada=None, versao="03.18", competencia_padrao=None, fp_num_apac=None,
+                   fp_medicos=None, fp_estab=None, notificar_erro=None, pasta_saida=None,
+                   busca_aproximada=False, trabalhadores=None, cbo=CBO_PADRAO, pasta_sigtap=None, fp_cache=None,
+                   fp_indice=None):
+    """
+    Gera uma remessa por competência a partir dos CSVs de pasta_entrada
+    (INPUT_DIR por padrão).
+
+    Retorna uma lista de resumos (um dict por arquivo, na ordem de
+    listar_csvs) com: arquivo, competencia, linhas, geradas, rejeitadas,
+    remessa e erro.
+    """
+    pasta_entrada = pasta_entrada or INPUT_DIR
+    FP_MEDICOS = fp_medicos or os.path.join(DATA_DIR, "medicos.csv")
+    FP_ESTAB = fp_estab or os.path.join(DATA_DIR, "estabelecimentos.csv")
+
+    arquivos = listar_csvs(pasta_entrada)
+    if not arquivos:
+        return []
+
+    inicializar_manager(fp_num_apac)
+    medicos, estabelecimentos = carregar_referencias(FP_MEDICOS, FP_ESTAB)
+    catalogo_sigtap = carregar_sigtap(pasta_sigtap) if pasta_sigtap else None
+
+    resumos = {}
+    grupos = {}
+    with ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+        for fp, df, competencia, erro in executor.map(lambda fp: _ler_arquivo(fp, competencia_padrao), arquivos):
+            resumos[fp] = {
+                "arquivo": fp, "competencia": competencia, "linhas": 0 if df is None else len(df),
+                "geradas": 0, "rejeitadas": 0, "remessa": "", "erro": erro,
+            }
+            if erro:
+                continue
+            if not competencia:
+                resumos[fp]["erro"] = "competência não identificada"
+                continue
+            grupos.setdefault(competencia, []).append((fp, df))
+
+        def gerar(competencia):
+            partes = grupos[competencia]
+            df = pd.concat([df for _, df in partes], ignore_index=True)
+            # posição inicial de cada arquivo no DataFrame concatenado
+            inicios = []
+            pos = 0
+            for _, parte in partes:
+                inicios.append(pos)
+                pos += len(parte)
+
+            def erro_grupo(msg):
+                if notificar_erro:
+                    notificar_erro(f"[{competencia}] {msg}")
+
+            arq, total, primeira, ultima, aceitos = gerar_remessa(
+                df, competencia, versao, medicos, estabelecimentos,
+                fp_num_apac=fp_num_apac, notificar_erro=erro_grupo, pasta_saida=pasta_saida,
+                busca_aproximada=busca_aproximada, nome_intervalo=f"intervalo_apac_{competencia}.txt",
+                cbo=cbo, catalogo_sigtap=catalogo_sigtap, fp_cache=fp_cache,
+                fp_indice=fp_indice
+            )
+            geradas = [0] * len(partes)
+            for idx in aceitos:
+                geradas[bisect.bisect_right(inicios, idx) - 1] += 1
+            return arq, geradas
+
+        futuros = {competencia: executor.submit(gerar, competencia) for competencia in sorted(grupos)}
+
+        for competencia, futuro in futuros.items():
+            partes = grupos[competencia]
+            try:
+                arq, geradas = futuro.result()
+            except Exception as e:
+                for fp, _ in partes:
+                    resumos[fp]["erro"] = str(e)
+                continue
+            for (fp, _), n in zip(partes, geradas):
+                resumos[fp]["geradas"] = n
+                resumos[fp]["rejeitadas"] = resumos[fp]["linhas"] - n
+                resumos[fp]["remessa"] = arq
+
+    return [resumos[fp] for fp in arquivos]
+
+
+def imprimir_resumo(resumos):
+    """Tabela simples (um arquivo por linha) do resultado de processar_lote."""
+    print(f"{'ARQUIVO':40} {'COMP':6} {'LINHAS':>7} {'GERADAS':>8} {'REJEIT.':>8}  REMESSA / ERRO")
+    for r in resumos:
+        destino = f"ERRO: {r['erro']}" if r["erro"] else os.path.basename(r["remessa"])
+        print(f"{os.path.basename(r['arquivo'])[:40]:40} {r['competencia'] or '-':6} "
+              f"{r['linhas']:>7} {r['geradas']:>8} {r['rejeitadas']:>8}  {destino}")
+    print(f"Total: {len(resumos)} arquivo(s), {sum(r['geradas'] for r in resumos)} APAC(s) geradas")
@@ -1,26 +1,22 @@
 import os
 import sys
-import unicodedata
 import threading
+import multiprocessing
 import locale
-import pandas as pd
 from datetime import datetime
 from PySide6 import QtCore, QtWidgets, QtGui
 
-if getattr(sys, 'frozen', False):
-    APPLICATION_PATH = os.path.dirname(sys.executable)
-else:
-    APPLICATION_PATH = os.path.dirname(os.path.abspath(__file__))
-
-BASE_DIR    = APPLICATION_PATH
-DATA_DIR    = os.path.join(BASE_DIR, "data")
-INPUT_DIR   = os.path.join(BASE_DIR, "input")
-OUTPUT_DIR  = os.path.join(BASE_DIR, "output")
+from motor import (
+    BASE_DIR,
+    DATA_DIR,
+    INPUT_DIR,
+    ler_csv_pacientes,
+    processar_remessa
+)
+from ingestao import estimar_linhas
+
 ASSETS_DIR  = os.path.join(BASE_DIR, "assets")
 
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(INPUT_DIR, exist_ok=True)
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(ASSETS_DIR, exist_ok=True)
 
 if getattr(sys, 'frozen', False):
@@ -28,31 +24,9 @@ if getattr(sys, 'frozen', False):
     if os.path.isdir(qt_plugins):
         os.environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = qt_plugins
 
-from utils import (
-    formatar_num,
-    formatar_char,
-    calcular_idade,
-    selecionar_procedimento,
-    MAPA_PROCEDIMENTOS_OFTALMO,
-    FIM_LINHA,
-    mapear_raca_cor,
-    sanitize_basic
-)
-
-from apac_manager import (
-    inicializar_manager,
-    consumir_apac,
-    salvar_numeracoes,
-    salvar_relatorio_intervalo_apac,
-    get_numeracoes_disponiveis,
-    devolver_apac,
-    NUMERACOES_APAC_MEMORIA
-)
-
-from header import montar_cabecalho
-from corpo import montar_corpo
-from variavel import montar_laudo_geral
-from procedimentos import gerar_bloco_procedimentos
+from apac_manager import contar_numeracoes_disponiveis, SUFIXO_DIARIO
+from referencias import aquecer_referencias
+from progresso import ProgressoLimitado, formatar_duracao
 
 locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
 
@@ -63,227 +37,19 @@ COR_TEXT = "#e6eef6"
 FONT = "Segoe UI"
 COR_PRINCIPAL = "#101015"
 
-def _converter_data_para_apac(data_str):
-    if isinstance(data_str, (datetime, pd.Timestamp)):
-        return data_str.strftime('%Y%m%d')
-    try:
-        base = str(data_str).split(" ")[0]
-        obj = datetime.strptime(base, "%d/%m/%Y")
-        return obj.strftime("%Y%m%d")
-    except Exception:
-        return "00000000"
-
-def remover_acentos_para_ascii(s: str) -> str:
-    if s is None:
-        return ""
-    return unicodedata.normalize('NFKD', str(s)).encode('ASCII', 'ignore').decode("ASCII")
-
-def ler_csv_pacientes(fp):
-    try:
-        df = pd.read_csv(fp, delimiter=";", encoding="latin1")
-    except UnicodeDecodeError:
-        df = pd.read_csv(fp, delimiter=";", encoding="cp1252")
-    except Exception:
-        df = pd.read_csv(fp, delimiter=";")
-    if len(df.columns) > 0 and str(df.columns[0]).startswith("Unnamed"):
-        df = df.iloc[:, 1:]
-    ren = {}
-    for col in df.columns:
-        if "Hor" in col:
-            ren[col] = "Data_Horario"
-        elif "Mãe" in col or "MAE" in col or "MÃ£" in col:
-            ren[col] = "Mae"
-        elif "Ra" in col and "Cor" in col:
-            ren[col] = "Raca_Cor"
-        elif "Profissional" in col:
-            ren[col] = "Nome_Medico_Solicitante"
-        elif "Unidade" in col:
-            ren[col] = "Nome_Unidade_Solicitante"
-        elif "Nascimento" in col:
-            ren[col] = "Data_Nascimento"
-    if ren:
-        df.rename(columns=ren, inplace=True)
-    df["Data_Nascimento"] = df.get("Data_Nascimento", "").apply(_converter_data_para_apac)
-    df["Data_Horario"] = df.get("Data_Horario", "").apply(_converter_data_para_apac)
-    return df
-
-def lookup_medico_cns(nome, df):
-    nome_l = sanitize_basic(nome).upper()
-    if not nome_l:
-        return {"apa_cnsres": formatar_num(0, 15), "nome_completo": ""}
-    try:
-        match = df[df["nome_completo"].str.upper().str.contains(nome_l, na=False)]
-        if not match.empty:
-            cns = sanitize_basic(match.iloc[0]["cartao_sus"])
-            nm = sanitize_basic(match.iloc[0]["nome_completo"])
-            return {"apa_cnsres": formatar_num(cns, 15), "nome_completo": nm}
-    except Exception:
-        pass
-    return {"apa_cnsres": formatar_num(0, 15), "nome_completo": nome_l}
-
-def lookup_cnes_data(unidade, df):
-    nome = sanitize_basic(unidade).upper()
-    base = {
-        'apa_coduf': "35",
-        'cbc-cgccpf': "47970769000104",
-        'cbc-rsp': "PEDRO TRIES",
-        'cbc-sgl': "SECRET",
-        'cbc-dst': "SMS",
-        'cbc-dst-in': "M",
-        'cod_mun_ibge': "351620 ",
-        'cnes_solicitante': "5778204"
-    }
-    if not nome:
-        return base
-    try:
-        match = df[df["desc_solicitante"].str.upper().str.contains(nome, na=False)]
-        if not match.empty:
-            cnes = sanitize_basic(match.iloc[0]["cod_solicitante"])
-            base["cnes_solicitante"] = formatar_num(cnes, 7)
-            return base
-    except Exception:
-        pass
-    return base
-
-def gerar_blocos_paciente(p, apac_num, medico_ref, cnes_ref, competencia):
-    cnes_solic = cnes_ref.get("cnes_solicitante", "5778204")
-    cnes_terc = " " * 7 if cnes_solic == "5778204" else cnes_solic
-    nasc = sanitize_basic(p.get("Data_Nascimento"))
-    cons = sanitize_basic(p.get("Data_Horario"))
-    if not nasc or len(nasc) != 8:
-        raise ValueError(f"Data de nascimento inválida: {nasc}")
-    if not cons or len(cons) != 8:
-        raise ValueError(f"Data de consulta inválida: {cons}")
-    idade = calcular_idade(nasc, cons)
-    proc_sel = selecionar_procedimento(idade)
-    cod_princ = next(k for k, v in MAPA_PROCEDIMENTOS_OFTALMO.items() if v == proc_sel)
-    cod_princ_fmt = cod_princ.replace("-", "")
-    raca = mapear_raca_cor(sanitize_basic(p.get("Raca_Cor", "")))
-    cid_raw = sanitize_basic(p.get("CID", "")).upper()
-    cid = "".join(ch for ch in cid_raw if ch.isalnum())[:4]
-    mae = sanitize_basic(p.get("Mae", ""))
-    nome_resp = sanitize_basic(p.get("Nome", "")) if idade >= 18 else mae
-    dados = {
-        "apa_corpo": 14,
-        "apa_cmp": formatar_num(competencia, 6),
-        "apa_num": apac_num,
-        "apa_coduf": cnes_ref.get("apa_coduf", "35"),
-        "apa_codcnes": "5778204",
-        "apa_pr": cons,
-        "apa_dtiinval": cons,
-        "apa_dtfimval": cons,
-        "apa_tipate": "00",
-        "apa_tipapac": "3",
-        "apa_motsaida": "12",
-        "apa_dtobitoalta": cons,
-        "apa_datsol": cons,
-        "apa_dataut": cons,
-        "apa_codemis": "M351620001",
-        "apa_carate": "01",
-        "apa_apacant": "0",
-        "apa_nascpcnte": "010",
-        "APA_etnia": "",
-        "apa_cdlogr": "081",
-        "apa_dddtelcontato": formatar_char(sanitize_basic(p.get("DDD")), 2),
-        "apa_email": sanitize_basic(p.get("Email", "")),
-        "apa_strua": "N",
-        "apa_codsol": formatar_char(cnes_solic, 7),
-        "apa_npront": "",
-        "apa_cplpcnte": "",
-        "apa_nomepcnte": sanitize_basic(p.get("Nome", "")),
-        "apa_nomemae": mae,
-        "apa_nomeresp_pcte": nome_resp,
-        "apa_logpcnte": sanitize_basic(p.get("Rua", "")),
-        "apa_numpcnte": formatar_char(sanitize_basic(p.get("Nro", "")), 5),
-        "apa_ceppcnte": formatar_num(sanitize_basic(p.get("CEP", "")), 8),
-        "apa_munpcnte": cnes_ref.get("cod_mun_ibge", "351620 "),
-        "apa_datanascim": nasc,
-        "apa_sexopcnte": sanitize_basic(p.get("Sexo", "I"))[:1] or "I",
-        "apa_raca": raca,
-        "apa_cpfpcnte": formatar_num(sanitize_basic(p.get("CPF", "")), 11),
-        "apa_bairro": sanitize_basic(p.get("Bairro", "")),
-        "apa_telcontato": formatar_char(sanitize_basic(p.get("Contato 1", "")), 9),
-        "apa_ine": "",
-        "cid_paciente": cid,
-        "cid_secundario": "",
-        "apa_codprinc": cod_princ_fmt,
-        "apa_nomediretor": "PABLO DANIEL CHAVEZ LUNA",
-        "apa_cnspct": formatar_num(sanitize_basic(p.get("Cartão SUS", "")), 15),
-        "apa_cnsres": medico_ref.get("apa_cnsres", formatar_num(0, 15)),
-        "apa_cnsdir": "704800067495842",
-        "apa_cnsexec": medico_ref.get("apa_cnsres", formatar_num(0, 15)),
-        "apa_nomeresp": medico_ref.get("nome_completo", "")
-    }
-    linhas = []
-    linhas.append(montar_corpo(dados))
-    linhas.append(montar_laudo_geral(dados["apa_cmp"], apac_num, dados["cid_paciente"]))
-    linhas.extend(gerar_bloco_procedimentos(idade, dados["apa_cmp"], apac_num, cnes_terc))
-    return linhas
-
-def processar_remessa(fp_pacientes, competencia, versao, atualizar_status=None, fp_num_apac=None, fp_medicos=None, fp_estab=None):
-    
-    FP_MEDICOS = fp_medicos or os.path.join(DATA_DIR, "medicos.csv")
-    FP_ESTAB = fp_estab or os.path.join(DATA_DIR, "estabelecimentos.csv")
-    
-    inicializar_manager(fp_num_apac)
-    
-    df_p = ler_csv_pacientes(fp_pacientes)
-    df_m = pd.read_csv(FP_MEDICOS, delimiter=";") if os.path.exists(FP_MEDICOS) else pd.DataFrame()
-    df_e = pd.read_csv(FP_ESTAB, delimiter=";") if os.path.exists(FP_ESTAB) else pd.DataFrame()
-    linhas = []
-    primeira = None
-    ultima = None
-    total = 0
-    cnes_ref_header = lookup_cnes_data("", df_e)
-    
-    for idx, paciente in df_p.iterrows():
-        
-        apac_num_tentativa, rest = consumir_apac()
-        
-        if not apac_num_tentativa:
-            raise Exception("Numerações APAC esgotadas.")
-            
-        med_ref = lookup_medico_cns(sanitize_basic(paciente.get("Nome_Medico_Solicitante", "")), df_m)
-        cnes_ref = lookup_cnes_data(sanitize_basic(paciente.get("Nome_Unidade_Solicitante", "")), df_e)
-        cnes_ref_header = cnes_ref
-        
-        paciente_nome = sanitize_basic(paciente.get("Nome", f"Linha {idx+1}"))
-        
-        try:
-            blocos = gerar_blocos_paciente(paciente.to_dict(), apac_num_tentativa, med_ref, cnes_ref, competencia)
-            
-            if primeira is None:
-                primeira = apac_num_tentativa
-            ultima = apac_num_tentativa
-            linhas.extend(blocos)
-            total += 1
-            
-            if atualizar_status:
-                atualizar_status(total)
-                
-        except Exception as e:
-            devolver_apac(apac_num_tentativa)
-            
-            if atualizar_status:
-                QtCore.QMetaObject.invokeMethod(MainWindow.instance(), 'adicionar_historico', QtCore.Qt.QueuedConnection, 
-                                                QtCore.Q_ARG(str, f"⚠️ ERRO ({apac_num_tentativa}): Falha no paciente '{paciente_nome}': {str(e).splitlines()[0]}"))
-            
-            continue
-            
-    header_final = montar_cabecalho(competencia, cnes_ref_header, total, [], ultima, versao)
-    linhas.insert(0, header_final)
-    OUTPUT_FILE = os.path.join(OUTPUT_DIR, f"oci_oftalmo_{competencia}.txt")
-    with open(OUTPUT_FILE, "wb") as f:
-        for l in linhas:
-            f.write(remover_acentos_para_ascii(l).encode("ascii"))
-            
-    salvar_numeracoes(fp_num_apac)
-    salvar_relatorio_intervalo_apac(OUTPUT_FILE, primeira, ultima)
-    
-    return OUTPUT_FILE, total, primeira, ultima
+# espera após a última tecla no caminho da numeração antes de recontar
+ATRASO_CONTAGEM_MS = 400
+
+# linhas mantidas no histórico de processamento
+LIMITE_HISTORICO = 2000
+
+# intervalo mínimo (s) entre atualizações de progresso vindas do motor
+INTERVALO_PROGRESSO = 0.1
 
 class MainWindow(QtWidgets.QMainWindow):
     historico_signal = QtCore.Signal(str)
+    contagem_signal = QtCore.Signal(str, int, list)
+    progresso_signal = QtCore.Signal(int, int, float, float)
 
     def __init__(self):
         super().__init__()
@@ -291,8 +57,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.FP_NUMERACAO = os.path.join(DATA_DIR, "Numeração OCI.TXT")
         self.FP_MEDICOS = os.path.join(DATA_DIR, "medicos.csv")
         self.FP_ESTAB = os.path.join(DATA_DIR, "estabelecimentos.csv")
-        
-        num_oci = len(get_numeracoes_disponiveis(self.FP_NUMERACAO))
+
+        threading.Thread(target=aquecer_referencias, args=(self.FP_MEDICOS, self.FP_ESTAB), daemon=True).start()
         
         self.setWindowTitle("Gerador de Remessa APAC")
         icon_path = os.path.join(ASSETS_DIR, "mini.ico")
@@ -382,15 +148,26 @@ class MainWindow(QtWidgets.QMainWindow):
         self.entry_estab.setStyleSheet("background:#0b0b0b; color: #e6eef6; padding:4px; font-size:9pt;")
         left_layout.addWidget(self.entry_estab)
         
-        self.entry_numeracao.textChanged.connect(self.atualizar_contagem_apac)
-        
-        self.lbl_numeracoes = QtWidgets.QLabel(
-        f"Numerações APAC disponíveis: {num_oci}"
-        )
+        self.lbl_numeracoes = QtWidgets.QLabel("Numerações APAC disponíveis: ...")
         self.lbl_numeracoes.setStyleSheet(
         "color:#9be7ff; font-size:9pt; padding:3px;"
         )
         left_layout.addWidget(self.lbl_numeracoes)
+
+        # A contagem lê o arquivo de numeração inteiro: roda fora da thread da
+        # interface, só depois que o caminho para de mudar, e é refeita quando
+        # o arquivo (ou seu diário) muda no disco.
+        self._gerando = False
+        self._timer_contagem = QtCore.QTimer(self)
+        self._timer_contagem.setSingleShot(True)
+        self._timer_contagem.setInterval(ATRASO_CONTAGEM_MS)
+        self._timer_contagem.timeout.connect(self._contar_numeracoes)
+        self._observador_numeracao = QtCore.QFileSystemWatcher(self)
+        self._observador_numeracao.fileChanged.connect(self.atualizar_contagem_apac)
+        self._observador_numeracao.directoryChanged.connect(self.atualizar_contagem_apac)
+        self.contagem_signal.connect(self._on_contagem)
+        self.entry_numeracao.textChanged.connect(self.atualizar_contagem_apac)
+        self.atualizar_contagem_apac()
         left_layout.addStretch()
 
         right = QtWidgets.QFrame()
@@ -438,13 +215,17 @@ class MainWindow(QtWidgets.QMainWindow):
         lbl_hist.setStyleSheet(f"color:{COR_TEXT}; margin-top: 6px;")
         right_layout.addWidget(lbl_hist)
 
-        self.historico_text = QtWidgets.QTextEdit()
+        # texto simples com limite de linhas: as mais antigas saem do início,
+        # então o histórico não cresce nem fica lento em arquivos grandes
+        self.historico_text = QtWidgets.QPlainTextEdit()
         self.historico_text.setReadOnly(True)
-        self.historico_text.setText(f"Início: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n")
+        self.historico_text.setMaximumBlockCount(LIMITE_HISTORICO)
+        self.historico_text.setPlainText(f"Início: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
         self.historico_text.setStyleSheet("background:#0b0b0b; color: #e6eef6; border: none; font-size: 8pt;")
         right_layout.addWidget(self.historico_text)
 
         self.historico_signal.connect(self.adicionar_historico)
+        self.progresso_signal.connect(self._on_progresso)
 
         self.btn_gerar = QtWidgets.QPushButton("GERAR REMESSA APAC")
         self.btn_gerar.setStyleSheet(f"background:#05a37a; color:#fff; padding:10px; border-radius:6px; font-weight:700;")
@@ -475,7 +256,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     @QtCore.Slot(str)
     def adicionar_historico(self, texto):
-        self.historico_text.append(f"[{datetime.now().strftime('%H:%M:%S')}] {texto}")
+        self.historico_text.appendPlainText(f"[{datetime.now().strftime('%H:%M:%S')}] {texto}")
 
     def selecionar_csv(self):
         start_dir = INPUT_DIR if os.path.isdir(INPUT_DIR) else BASE_DIR
@@ -483,15 +264,43 @@ class MainWindow(QtWidgets.QMainWindow):
         if fp:
             self.entry_csv.setText(fp)
             
-    def atualizar_contagem_apac(self):
+    def atualizar_contagem_apac(self, *_):
+        # reinicia a espera a cada chamada: só a última dispara a contagem
+        self._timer_contagem.start()
+
+    def _contar_numeracoes(self):
+        # durante a geração o diário muda a todo instante; conta no final
+        if self._gerando:
+            return
         fp_num = self.entry_numeracao.text().strip()
-        num_oci = 0
-        try:
-            num_oci = len(get_numeracoes_disponiveis(fp_num))
-        except Exception:
-            pass
+
+        def contar():
+            # stat e leitura ficam nesta thread (o caminho pode ser de rede)
+            try:
+                num_oci = contar_numeracoes_disponiveis(fp_num)
+            except Exception:
+                num_oci = 0
+            # a pasta avisa quando o arquivo é substituído ou o diário é criado
+            observar = [fp for fp in (fp_num, fp_num + SUFIXO_DIARIO) if os.path.isfile(fp)]
+            if os.path.isdir(os.path.dirname(fp_num)):
+                observar.append(os.path.dirname(fp_num))
+            self.contagem_signal.emit(fp_num, num_oci, observar)
+
+        threading.Thread(target=contar, daemon=True).start()
+
+    @QtCore.Slot(str, int, list)
+    def _on_contagem(self, fp_num, num_oci, observar):
+        # resultado de um caminho que já foi trocado no campo: descarta
+        if fp_num != self.entry_numeracao.text().strip():
+            return
         self.lbl_numeracoes.setText(f"Numerações APAC disponíveis: {num_oci}")
 
+        observados = self._observador_numeracao.files() + self._observador_numeracao.directories()
+        if sorted(observados) != sorted(observar):
+            if observados:
+                self._observador_numeracao.removePaths(observados)
+            if observar:
+                self._observador_numeracao.addPaths(observar)
 
     def validar_campos(self):
         fp = self.entry_csv.text().strip()
@@ -539,35 +348,37 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.historico_signal.emit(f"Iniciando processamento para Comp. {comp}...")
         self.historico_signal.emit(f"Numeração lida de: {os.path.basename(fp_num)}")
-        
-        try:
-            df = ler_csv_pacientes(fp_pacientes)
-            total = len(df.index)
-            self.historico_signal.emit(f"CSV lido: {total} registros encontrados.")
-        except Exception as e:
-            self.historico_signal.emit(f"ERRO ao ler CSV: {e}")
-            total = 1
-            
+
         self.progress.setValue(0)
         self.status_label.setText("Status: iniciando...")
         self.btn_gerar.setEnabled(False)
-        
+        self._gerando = True
+
+        # o CSV é lido uma única vez, na thread de trabalho
         threading.Thread(target=self._worker, 
-                         args=(fp_pacientes, comp, vers, total, fp_num, fp_med, fp_est), 
+                         args=(fp_pacientes, comp, vers, fp_num, fp_med, fp_est), 
                          daemon=True).start()
 
-    def _worker(self, fp_pacientes, comp, vers, total, fp_num, fp_med, fp_est):
-        def atualizar_status(n):
-            try:
-                pct = int((n / max(1, total)) * 100)
-                QtCore.QMetaObject.invokeMethod(self.progress, "setValue", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(int, pct))
-                QtCore.QMetaObject.invokeMethod(self.status_label, "setText", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, f"Status: geradas {n}/{total}"))
-            except Exception:
-                QtCore.QMetaObject.invokeMethod(self.status_label, "setText", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, f"Status: geradas {n}"))
+    def _worker(self, fp_pacientes, comp, vers, fp_num, fp_med, fp_est):
+        def emitir_progresso(n, total_esperado, taxa, restante):
+            self.progresso_signal.emit(n, total_esperado, taxa, -1.0 if restante is None else restante)
+
         try:
+            # contagem rápida de linhas para o progresso enquanto o CSV é lido
+            emitir_progresso(0, estimar_linhas(fp_pacientes), 0.0, None)
+            try:
+                df = ler_csv_pacientes(fp_pacientes)
+            except Exception as e:
+                self.historico_signal.emit(f"ERRO ao ler CSV: {e}")
+                raise
+            total = len(df.index)
+            self.historico_signal.emit(f"CSV lido: {total} registros encontrados.")
+
+            atualizar_status = ProgressoLimitado(total, emitir_progresso, INTERVALO_PROGRESSO)
             arq, total_geradas, primeira, ultima = processar_remessa(
                 fp_pacientes, comp, vers, atualizar_status=atualizar_status,
-                fp_num_apac=fp_num, fp_medicos=fp_med, fp_estab=fp_est
+                fp_num_apac=fp_num, fp_medicos=fp_med, fp_estab=fp_est,
+                notificar_erro=self.historico_signal.emit, df_pacientes=df
             )
             
             QtCore.QMetaObject.invokeMethod(self, "_on_finished", QtCore.Qt.QueuedConnection,
@@ -577,12 +388,23 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception as e:
             QtCore.QMetaObject.invokeMethod(self, "_on_error", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, str(e)))
 
+    @QtCore.Slot(int, int, float, float)
+    def _on_progresso(self, n, total, taxa, restante):
+        self.progress.setValue(min(100, int(n / max(1, total) * 100)))
+        texto = f"Status: geradas {n}/{total}"
+        if taxa:
+            texto += f" · {taxa:.0f}/s"
+        if restante >= 0:
+            texto += f" · restam {formatar_duracao(restante)}"
+        self.status_label.setText(texto)
+
     @QtCore.Slot(str, int, str, str)
     def _on_finished(self, arq, total_geradas, primeira, ultima): 
         self.progress.setValue(100)
         self.status_label.setText(f"Concluído: {total_geradas} APACs ({primeira} → {ultima})")
         self.historico_signal.emit(f"✅ SUCESSO! Arq.: {arq}, {total_geradas} APACs.")
-        
+
+        self._gerando = False
         self.atualizar_contagem_apac()
         
         QtWidgets.QMessageBox.information(self, "Sucesso", f"Arquivo gerado: {arq}\nTotal APACs: {total_geradas}\n{primeira} → {ultima}")
@@ -593,13 +415,17 @@ class MainWindow(QtWidgets.QMainWindow):
         self.progress.setValue(0)
         self.status_label.setText("Status: Erro!")
         self.historico_signal.emit(f"❌ ERRO: {msg.splitlines()[0]}")
-        
+
+        self._gerando = False
         self.atualizar_contagem_apac()
         
         QtWidgets.QMessageBox.critical(self, "Erro", msg)
         self.btn_gerar.setEnabled(True)
 
 if __name__ == "__main__":
+    # o modo paralelo do motor usa processos; no executável congelado os
+    # filhos reentram aqui e precisam ser desviados antes de abrir a janela
+    multiprocessing.freeze_support()
     app = QtWidgets.QApplication(sys.argv)
     win = MainWindow()
     win.show()
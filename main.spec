@@ -19,10 +19,19 @@ hiddenimports = collect_submodules('PySide6')
 a = Analysis(
     [
         'main.py',
+        'motor.py',
+        'ingestao.py',
+        'escritor.py',
         'apac_manager.py',
+        'cache_remessa.py',
         'corpo.py',
         'header.py',
+        'indice_apac.py',
+        'layout.py',
         'procedimentos.py',
+        'progresso.py',
+        'referencias.py',
+        'sigtap.py',
         'utils.py',
         'variavel.py'
     ],
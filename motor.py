@@ -0,0 +1,678 @@
+import os
+import sys
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+if getattr(sys, 'frozen', False):
+    APPLICATION_PATH = os.path.dirname(sys.executable)
+else:
+    APPLICATION_PATH = os.path.dirname(os.path.abspath(__file__))
+
+BASE_DIR    = APPLICATION_PATH
+DATA_DIR    = os.path.join(BASE_DIR, "data")
+INPUT_DIR   = os.path.join(BASE_DIR, "input")
+OUTPUT_DIR  = os.path.join(BASE_DIR, "output")
+
+os.makedirs(DATA_DIR, exist_ok=True)
+os.makedirs(INPUT_DIR, exist_ok=True)
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+from utils import (
+    formatar_num,
+    formatar_char,
+    calcular_idade,
+    calcular_idade_serie,
+    faixa_procedimento,
+    faixa_procedimento_serie,
+    mapear_raca_cor,
+    sanitize_basic,
+    formatar_num_serie,
+    formatar_char_serie,
+    validar_cpf_serie,
+    validar_cns_serie,
+    MAPA_RACA_COR
+)
+
+from apac_manager import (
+    inicializar_manager,
+    reservar_apacs,
+    devolver_reserva,
+    apac_disponivel,
+    salvar_numeracoes,
+    salvar_relatorio_intervalo_apac
+)
+
+from header import montar_cabecalho
+from corpo import montar_corpo, montar_corpos_lote
+from variavel import montar_laudo_geral
+from procedimentos import gerar_bloco_procedimentos, montar_bloco_procedimentos, CATALOGO_PROCEDIMENTOS
+from escritor import EscritorRemessa
+from referencias import carregar_referencias
+from ingestao import ler_csv_pacientes, coluna_texto, cid_serie, erro_datas, erros_datas
+from layout import CBO_PADRAO
+from sigtap import carregar_sigtap
+from cache_remessa import CacheRenderizacao, chaves_pacientes
+from indice_apac import IndiceApac, chaves_atendimentos
+
+def _resolver_medico(nome_l, medicos, aproximado):
+    if not nome_l:
+        return {"apa_cnsres": formatar_num(0, 15), "nome_completo": ""}
+    try:
+        match = medicos.buscar(nome_l, aproximado)
+        if match is not None:
+            cns = sanitize_basic(match["cartao_sus"])
+            nm = sanitize_basic(match["nome_completo"])
+            return {"apa_cnsres": formatar_num(cns, 15), "nome_completo": nm}
+    except Exception:
+        pass
+    return {"apa_cnsres": formatar_num(0, 15), "nome_completo": nome_l}
+
+def lookup_medico_cns(nome, medicos, aproximado=False):
+    """
+    medicos: TabelaReferencia de medicos.csv indexada por nome_completo.
+    O resultado de cada nome distinto é memorizado na própria tabela.
+    """
+    nome_l = sanitize_basic(nome).upper()
+    chave = (nome_l, aproximado)
+    ref = medicos.resultados.get(chave)
+    if ref is None:
+        ref = medicos.resultados[chave] = _resolver_medico(nome_l, medicos, aproximado)
+    return ref
+
+def _resolver_cnes(nome, estabelecimentos, aproximado):
+    base = {
+        'apa_coduf': "35",
+        'cbc-cgccpf': "47970769000104",
+        'cbc-rsp': "PEDRO TRIES",
+        'cbc-sgl': "SECRET",
+        'cbc-dst': "SMS",
+        'cbc-dst-in': "M",
+        'cod_mun_ibge': "351620 ",
+        'cnes_solicitante': "5778204"
+    }
+    if not nome:
+        return base
+    try:
+        match = estabelecimentos.buscar(nome, aproximado)
+        if match is not None:
+            cnes = sanitize_basic(match["cod_solicitante"])
+            base["cnes_solicitante"] = formatar_num(cnes, 7)
+            return base
+    except Exception:
+        pass
+    return base
+
+def lookup_cnes_data(unidade, estabelecimentos, aproximado=False):
+    """
+    estabelecimentos: TabelaReferencia de estabelecimentos.csv indexada por
+    desc_solicitante. O resultado de cada unidade distinta é memorizado e
+    compartilhado entre chamadas; não altere o dicionário devolvido.
+    """
+    nome = sanitize_basic(unidade).upper()
+    chave = (nome, aproximado)
+    ref = estabelecimentos.resultados.get(chave)
+    if ref is None:
+        ref = estabelecimentos.resultados[chave] = _resolver_cnes(nome, estabelecimentos, aproximado)
+    return ref
+
+def gerar_blocos_paciente(p, apac_num, medico_ref, cnes_ref, competencia):
+    cnes_solic = cnes_ref.get("cnes_solicitante", "5778204")
+    cnes_terc = " " * 7 if cnes_solic == "5778204" else cnes_solic
+    nasc = sanitize_basic(p.get("Data_Nascimento"))
+    cons = sanitize_basic(p.get("Data_Horario"))
+    erro = erro_datas(nasc, cons)
+    if erro:
+        raise ValueError(erro)
+    idade = calcular_idade(nasc, cons)
+    cod_princ_fmt = faixa_procedimento(idade).replace("-", "")
+    raca = mapear_raca_cor(sanitize_basic(p.get("Raca_Cor", "")))
+    cid_raw = sanitize_basic(p.get("CID", "")).upper()
+    cid = "".join(ch for ch in cid_raw if ch.isalnum())[:4]
+    mae = sanitize_basic(p.get("Mae", ""))
+    nome_resp = sanitize_basic(p.get("Nome", "")) if idade >= 18 else mae
+    dados = {
+        "apa_corpo": 14,
+        "apa_cmp": formatar_num(competencia, 6),
+        "apa_num": apac_num,
+        "apa_coduf": cnes_ref.get("apa_coduf", "35"),
+        "apa_codcnes": "5778204",
+        "apa_pr": cons,
+        "apa_dtiinval": cons,
+        "apa_dtfimval": cons,
+        "apa_tipate": "00",
+        "apa_tipapac": "3",
+        "apa_motsaida": "12",
+        "apa_dtobitoalta": cons,
+        "apa_datsol": cons,
+        "apa_dataut": cons,
+        "apa_codemis": "M351620001",
+        "apa_carate": "01",
+        "apa_apacant": "0",
+        "apa_nascpcnte": "010",
+        "APA_etnia": "",
+        "apa_cdlogr": "081",
+        "apa_dddtelcontato": formatar_char(sanitize_basic(p.get("DDD")), 2),
+        "apa_email": sanitize_basic(p.get("Email", "")),
+        "apa_strua": "N",
+        "apa_codsol": formatar_char(cnes_solic, 7),
+        "apa_npront": "",
+        "apa_cplpcnte": "",
+        "apa_nomepcnte": sanitize_basic(p.get("Nome", "")),
+        "apa_nomemae": mae,
+        "apa_nomeresp_pcte": nome_resp,
+        "apa_logpcnte": sanitize_basic(p.get("Rua", "")),
+        "apa_numpcnte": formatar_char(sanitize_basic(p.get("Nro", "")), 5),
+        "apa_ceppcnte": formatar_num(sanitize_basic(p.get("CEP", "")), 8),
+        "apa_munpcnte": cnes_ref.get("cod_mun_ibge", "351620 "),
+        "apa_datanascim": nasc,
+        "apa_sexopcnte": sanitize_basic(p.get("Sexo", "I"))[:1] or "I",
+        "apa_raca": raca,
+        "apa_cpfpcnte": formatar_num(sanitize_basic(p.get("CPF", "")), 11),
+        "apa_bairro": sanitize_basic(p.get("Bairro", "")),
+        "apa_telcontato": formatar_char(sanitize_basic(p.get("Contato 1", "")), 9),
+        "apa_ine": "",
+        "cid_paciente": cid,
+        "cid_secundario": "",
+        "apa_codprinc": cod_princ_fmt,
+        "apa_nomediretor": "PABLO DANIEL CHAVEZ LUNA",
+        "apa_cnspct": formatar_num(sanitize_basic(p.get("Cartão SUS", "")), 15),
+        "apa_cnsres": medico_ref.get("apa_cnsres", formatar_num(0, 15)),
+        "apa_cnsdir": "704800067495842",
+        "apa_cnsexec": medico_ref.get("apa_cnsres", formatar_num(0, 15)),
+        "apa_nomeresp": medico_ref.get("nome_completo", "")
+    }
+    linhas = []
+    linhas.append(montar_corpo(dados))
+    linhas.append(montar_laudo_geral(dados["apa_cmp"], apac_num, dados["cid_paciente"]))
+    linhas.extend(gerar_bloco_procedimentos(idade, dados["apa_cmp"], apac_num, cnes_terc))
+    return linhas
+
+def montar_dados_lote(df, apacs, medicos_ref, cnes_refs, competencia):
+    """
+    Versão em lote do dicionário montado por gerar_blocos_paciente: uma linha
+    por paciente de df, na mesma ordem de apacs/medicos_ref/cnes_refs.
+    Inclui as colunas auxiliares "idade", "faixa" e "cnes_terceiro".
+    """
+    idx = df.index
+    cmp_fmt = formatar_num(competencia, 6)
+    cnes_solic = pd.Series([c.get("cnes_solicitante", "5778204") for c in cnes_refs], index=idx, dtype=object)
+    cnes_terc = cnes_solic.where(cnes_solic != "5778204", " " * 7)
+    nasc = coluna_texto(df, "Data_Nascimento")
+    cons = coluna_texto(df, "Data_Horario")
+    idade = calcular_idade_serie(nasc, cons)
+    faixa = faixa_procedimento_serie(idade)
+    cod_princ_fmt = faixa.str.replace("-", "")
+    raca = coluna_texto(df, "Raca_Cor").str.upper().map(MAPA_RACA_COR).fillna("01")
+    cid = cid_serie(df)
+    mae = coluna_texto(df, "Mae")
+    nome = coluna_texto(df, "Nome")
+    sexo = coluna_texto(df, "Sexo", "I").str.slice(0, 1)
+    cns_med = [m.get("apa_cnsres", formatar_num(0, 15)) for m in medicos_ref]
+
+    dados = pd.DataFrame({
+        "apa_corpo": 14,
+        "apa_cmp": cmp_fmt,
+        "apa_num": list(apacs),
+        "apa_coduf": [c.get("apa_coduf", "35") for c in cnes_refs],
+        "apa_codcnes": "5778204",
+        "apa_pr": cons,
+        "apa_dtiinval": cons,
+        "apa_dtfimval": cons,
+        "apa_tipate": "00",
+        "apa_tipapac": "3",
+        "apa_motsaida": "12",
+        "apa_dtobitoalta": cons,
+        "apa_datsol": cons,
+        "apa_dataut": cons,
+        "apa_codemis": "M351620001",
+        "apa_carate": "01",
+        "apa_apacant": "0",
+        "apa_nascpcnte": "010",
+        "APA_etnia": "",
+        "apa_cdlogr": "081",
+        "apa_dddtelcontato": formatar_char_serie(coluna_texto(df, "DDD"), 2),
+        "apa_email": coluna_texto(df, "Email"),
+        "apa_strua": "N",
+        "apa_codsol": formatar_char_serie(cnes_solic, 7),
+        "apa_npront": "",
+        "apa_cplpcnte": "",
+        "apa_nomepcnte": nome,
+        "apa_nomemae": mae,
+        "apa_nomeresp_pcte": nome.where(idade >= 18, mae),
+        "apa_logpcnte": coluna_texto(df, "Rua"),
+        "apa_numpcnte": formatar_char_serie(coluna_texto(df, "Nro"), 5),
+        "apa_ceppcnte": formatar_num_serie(coluna_texto(df, "CEP"), 8),
+        "apa_munpcnte": [c.get("cod_mun_ibge", "351620 ") for c in cnes_refs],
+        "apa_datanascim": nasc,
+        "apa_sexopcnte": sexo.where(sexo != "", "I"),
+        "apa_raca": raca,
+        "apa_cpfpcnte": formatar_num_serie(coluna_texto(df, "CPF"), 11),
+        "apa_bairro": coluna_texto(df, "Bairro"),
+        "apa_telcontato": formatar_char_serie(coluna_texto(df, "Contato 1"), 9),
+        "apa_ine": "",
+        "cid_paciente": cid,
+        "cid_secundario": "",
+        "apa_codprinc": cod_princ_fmt,
+        "apa_nomediretor": "PABLO DANIEL CHAVEZ LUNA",
+        "apa_cnspct": formatar_num_serie(coluna_texto(df, "Cartão SUS"), 15),
+        "apa_cnsres": cns_med,
+        "apa_cnsdir": "704800067495842",
+        "apa_cnsexec": cns_med,
+        "apa_nomeresp": [m.get("nome_completo", "") for m in medicos_ref],
+        "idade": idade,
+        "faixa": faixa,
+        "cnes_terceiro": cnes_terc
+    }, index=idx)
+    return dados
+
+def gerar_blocos_lote(df, apacs, medicos_ref, cnes_refs, competencia, cbo=CBO_PADRAO):
+    """
+    Equivalente a gerar_blocos_paciente para vários pacientes de uma vez.
+    Retorna uma string por paciente (Registros 14, 06 e 13 concatenados),
+    na ordem de df. Os pacientes já devem ter as datas validadas.
+    """
+    dados = montar_dados_lote(df, apacs, medicos_ref, cnes_refs, competencia)
+    corpos = montar_corpos_lote(dados)
+    blocos = []
+    for corpo, apac_num, cmp_fmt, cid, faixa, cnes_terc in zip(
+        corpos, dados["apa_num"], dados["apa_cmp"], dados["cid_paciente"],
+        dados["faixa"], dados["cnes_terceiro"]
+    ):
+        blocos.append(
+            corpo
+            + montar_laudo_geral(cmp_fmt, apac_num, cid)
+            + montar_bloco_procedimentos(faixa, cmp_fmt, apac_num, cnes_terc, cbo)
+        )
+    return blocos
+
+TAMANHO_MIN_FATIA = 2000
+
+def _numerar_ocorrencias(chaves, ocorrencias):
+    """
+    Chaves que se repetem na remessa ganham o sufixo "#n" a partir da segunda
+    ocorrência (ocorrencias acumula as contagens entre lotes). None fica None.
+    """
+    for pos, chave in enumerate(chaves):
+        if chave is None:
+            continue
+        n = ocorrencias.get(chave, 0)
+        ocorrencias[chave] = n + 1
+        if n:
+            chaves[pos] = f"{chave}#{n}"
+    return chaves
+
+def _chaves_atendimentos(df):
+    """Chave do índice de APACs (indice_apac) de cada paciente de df."""
+    nasc = coluna_texto(df, "Data_Nascimento")
+    cons = coluna_texto(df, "Data_Horario")
+    faixas = faixa_procedimento_serie(calcular_idade_serie(nasc, cons))
+    return chaves_atendimentos(coluna_texto(df, "CPF"), coluna_texto(df, "Cartão SUS"), cons, faixas)
+
+def _gerar_blocos_fatia(args):
+    return gerar_blocos_lote(*args)
+
+def _gerar_blocos_paralelo(df, apacs, medicos_ref, cnes_refs, competencia, cbo, processos):
+    """
+    gerar_blocos_lote distribuído em processos: df é dividido em fatias
+    contíguas (cada uma com seu bloco contíguo de apacs) e os blocos são
+    devolvidos na ordem original, fatia a fatia.
+    """
+    processos = processos or os.cpu_count() or 1
+    n = len(df)
+    tamanho = max(TAMANHO_MIN_FATIA, -(-n // (processos * 4)))
+    fatias = (
+        (df.iloc[i:i + tamanho], apacs[i:i + tamanho], medicos_ref[i:i + tamanho],
+         cnes_refs[i:i + tamanho], competencia, cbo)
+        for i in range(0, n, tamanho)
+    )
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        for blocos in executor.map(_gerar_blocos_fatia, fatias):
+            yield from blocos
+
+def processar_remessa(fp_pacientes, competencia, versao, atualizar_status=None, fp_num_apac=None, fp_medicos=None, fp_estab=None,
+                      notificar_erro=None, pasta_saida=None, busca_aproximada=False, processos=1,
+                      tamanho_lote=None, cbo=CBO_PADRAO, pasta_sigtap=None, fp_cache=None, fp_indice=None,
+                      df_pacientes=None):
+    """
+    Gera a remessa APAC sem depender da interface gráfica.
+
+    atualizar_status(n) é chamado a cada paciente gerado e notificar_erro(msg)
+    a cada paciente rejeitado; ambos são opcionais. Com busca_aproximada,
+    médicos/unidades sem correspondência exata no nome são resolvidos pelo
+    nome mais parecido da tabela.
+
+    processos > 1 renderiza os pacientes em paralelo (ProcessPoolExecutor);
+    0/None usa todos os núcleos. A saída é idêntica à execução serial.
+
+    Com tamanho_lote, o CSV é lido e processado em lotes dessa quantidade de
+    linhas, com memória limitada ao lote (para arquivos muito grandes).
+
+    cbo vai nos Registros 13. Com pasta_sigtap (tabelas do SIGTAP da
+    competência), cada paciente tem os procedimentos conferidos no SIGTAP
+    e as incompatibilidades são avisadas por notificar_erro.
+
+    fp_cache: cache SQLite dos pacientes já renderizados; fp_indice: índice
+    SQLite das APACs já atribuídas por atendimento (ver gerar_remessa).
+
+    df_pacientes: o CSV já lido por ler_csv_pacientes (DataFrame ou iterador
+    de lotes), para quem já precisou ler o arquivo antes (ex.: a interface,
+    que conta as linhas); fp_pacientes então não é lido de novo.
+    """
+
+    FP_MEDICOS = fp_medicos or os.path.join(DATA_DIR, "medicos.csv")
+    FP_ESTAB = fp_estab or os.path.join(DATA_DIR, "estabelecimentos.csv")
+    
+    inicializar_manager(fp_num_apac)
+    
+    df_p = df_pacientes if df_pacientes is not None else ler_csv_pacientes(fp_pacientes, tamanho_lote)
+    medicos, estabelecimentos = carregar_referencias(FP_MEDICOS, FP_ESTAB)
+    catalogo_sigtap = carregar_sigtap(pasta_sigtap) if pasta_sigtap else None
+
+    arquivo, total, primeira, ultima, _ = gerar_remessa(
+        df_p, competencia, versao, medicos, estabelecimentos,
+        fp_num_apac=fp_num_apac, atualizar_status=atualizar_status, notificar_erro=notificar_erro,
+        pasta_saida=pasta_saida, busca_aproximada=busca_aproximada, processos=processos,
+        cbo=cbo, catalogo_sigtap=catalogo_sigtap, fp_cache=fp_cache, fp_indice=fp_indice
+    )
+    return arquivo, total, primeira, ultima
+
+def _validar_pacientes(df_p, medicos, estabelecimentos, busca_aproximada=False, notificar_erro=None):
+    """
+    Confere as datas e resolve médico/unidade de cada paciente de df_p.
+    Retorna (aceitos, medicos_ref, cnes_refs, ultimo_cnes_ref): os índices
+    aceitos com suas referências e a unidade da última linha (aceita ou não),
+    que vai para o cabeçalho.
+    """
+    nascimentos = coluna_texto(df_p, "Data_Nascimento")
+    consultas = coluna_texto(df_p, "Data_Horario")
+    erros = erros_datas(nascimentos, consultas)
+    medicos_solic = coluna_texto(df_p, "Nome_Medico_Solicitante")
+    unidades_solic = coluna_texto(df_p, "Nome_Unidade_Solicitante")
+    if "Nome" in df_p.columns:
+        nomes = coluna_texto(df_p, "Nome")
+    else:
+        nomes = [f"Linha {idx+1}" for idx in df_p.index]
+
+    aceitos = []
+    medicos_ref = []
+    cnes_refs = []
+    cnes_ref = None
+
+    for idx, medico, unidade, paciente_nome, erro in zip(df_p.index, medicos_solic, unidades_solic, nomes, erros):
+
+        med_ref = lookup_medico_cns(medico, medicos, busca_aproximada)
+        cnes_ref = lookup_cnes_data(unidade, estabelecimentos, busca_aproximada)
+
+        if erro:
+            if notificar_erro:
+                notificar_erro(f"⚠️ ERRO: Falha no paciente '{paciente_nome}': {erro}")
+            continue
+
+        aceitos.append(idx)
+        medicos_ref.append(med_ref)
+        cnes_refs.append(cnes_ref)
+
+    return aceitos, medicos_ref, cnes_refs, cnes_ref
+
+# Quantos exemplos (linhas do CSV, nomes) cada aviso agregado mostra
+EXEMPLOS_AVISO = 5
+
+def _exemplos(itens, limite=EXEMPLOS_AVISO):
+    itens = [str(i) for i in itens]
+    return ", ".join(itens[:limite]) + (", ..." if len(itens) > limite else "")
+
+def _verificar_sigtap(df, catalogo, cbo, notificar_erro):
+    """
+    Confere no SIGTAP os Registros 13 de cada paciente de df (já validado).
+    As incompatibilidades são avisadas, não rejeitam o paciente. Pacientes
+    com a mesma combinação de faixa, idade, sexo e CID são conferidos uma vez,
+    e cada problema é avisado uma vez, com a quantidade de pacientes e as
+    primeiras linhas do CSV (como em _verificar_documentos).
+    """
+    if notificar_erro is None:
+        return
+    nasc = coluna_texto(df, "Data_Nascimento")
+    cons = coluna_texto(df, "Data_Horario")
+    meses = calcular_idade_serie(nasc, cons, em_meses=True)
+    faixas = faixa_procedimento_serie(calcular_idade_serie(nasc, cons))
+    sexos = coluna_texto(df, "Sexo", "I").str.slice(0, 1).str.upper()
+    cids = cid_serie(df)
+
+    problemas = {}
+    linhas_por_problema = {}
+    for linha, faixa, idade_meses, sexo, cid in zip(df.index + 2, faixas, meses, sexos, cids):
+        chave = (faixa, idade_meses, sexo, cid)
+        if chave not in problemas:
+            problemas[chave] = [
+                problema
+                for cod, qtd, _ in CATALOGO_PROCEDIMENTOS[faixa]
+                for problema in catalogo.verificar(cod, qtd, cbo, idade_meses, sexo, cid)
+            ]
+        for problema in problemas[chave]:
+            linhas_por_problema.setdefault(problema, []).append(linha)
+
+    for problema, linhas in linhas_por_problema.items():
+        notificar_erro(f"⚠️ AVISO SIGTAP: {len(linhas)} paciente(s): {problema} (linhas {_exemplos(linhas)})")
+
+def _verificar_documentos(df, medicos_ref, notificar_erro):
+    """
+    Confere os dígitos verificadores do CPF e do Cartão SUS de cada paciente
+    de df (já validado) e do Cartão SUS do médico resolvido. Documento não
+    informado (só zeros) não é conferido; inválidos são avisados, não
+    rejeitam o paciente (o SIA é quem recusa).
+
+    Os avisos são agregados: uma mensagem por tipo de documento com a
+    quantidade e as primeiras linhas do CSV (o detalhe por paciente fica
+    no preflight), para não encher o histórico da interface.
+    """
+    if notificar_erro is None or df.empty:
+        return
+    for rotulo, coluna, tamanho, validar in (("CPF", "CPF", 11, validar_cpf_serie),
+                                             ("Cartão SUS", "Cartão SUS", 15, validar_cns_serie)):
+        doc = formatar_num_serie(coluna_texto(df, coluna), tamanho)
+        invalidos = (doc != "0" * tamanho) & ~validar(doc)
+        if invalidos.any():
+            notificar_erro(f"⚠️ AVISO: {int(invalidos.sum())} paciente(s) com {rotulo} inválido "
+                           f"(linhas {_exemplos(df.index[invalidos.to_numpy()] + 2)})")
+
+    cns_med = pd.Series([m.get("apa_cnsres", "0" * 15) for m in medicos_ref], index=df.index)
+    invalidos = (cns_med != "0" * 15) & ~validar_cns_serie(cns_med)
+    if invalidos.any():
+        nomes = pd.unique(pd.Series([m.get("nome_completo", "") for m in medicos_ref])[invalidos.to_numpy()])
+        notificar_erro(f"⚠️ AVISO: {int(invalidos.sum())} paciente(s) com Cartão SUS do médico inválido "
+                       f"({_exemplos(nomes)})")
+
+def _encerrar_base(rotulo, base, confirmar):
+    """
+    Confirma (remessa gravada) ou descarta as entradas pendentes de uma base
+    SQLite (cache ou índice) e a fecha. Falhas só são avisadas: a numeração
+    não depende delas.
+    """
+    try:
+        if confirmar:
+            base.confirmar()
+        else:
+            base.descartar()
+    except Exception as e:
+        acao = "atualizado" if confirmar else "descartado"
+        print(f"Aviso: {rotulo} {base.caminho} não foi {acao}: {e}")
+    finally:
+        base.fechar()
+
+def gerar_remessa(df_p, competencia, versao, medicos, estabelecimentos, fp_num_apac=None, atualizar_status=None,
+                  notificar_erro=None, pasta_saida=None, busca_aproximada=False, processos=1,
+                  nome_intervalo="intervalo_apac.txt", cbo=CBO_PADRAO, catalogo_sigtap=None, fp_cache=None,
+                  fp_indice=None):
+    """
+    Núcleo de processar_remessa: gera oci_oftalmo_<competencia>.txt a partir
+    de um DataFrame já lido (ler_csv_pacientes) e de referências já
+    carregadas, usando o pool de numeração já inicializado.
+
+    df_p pode também ser um iterável de DataFrames (ler_csv_pacientes com
+    tamanho_lote): cada lote é validado, numerado, renderizado e gravado
+    antes do próximo ser lido, e entre lotes só ficam os contadores
+    (total, primeira/última APAC, unidade do cabeçalho).
+
+    catalogo_sigtap (sigtap.carregar_sigtap), se informado, confere os
+    procedimentos de cada paciente aceito; ver _verificar_sigtap.
+
+    fp_cache (arquivo SQLite, ver cache_remessa) reaproveita os pacientes
+    que não mudaram desde uma geração anterior: saem do cache já
+    renderizados e com a mesma APAC; só os demais gastam numeração.
+
+    fp_indice (arquivo SQLite, ver indice_apac) devolve a APAC já atribuída
+    ao mesmo atendimento (paciente, data e procedimento) antes de consumir
+    o pool, e registra as atribuições desta remessa.
+
+    Não reinicializa o manager, de modo que várias remessas (ex.: o modo
+    lote) podem compartilhar o mesmo pool e as mesmas tabelas.
+    Retorna (arquivo, total, primeira, ultima, aceitos), em que aceitos são
+    os índices de df_p que viraram APAC.
+    """
+    primeira = None
+    ultima = None
+    total = 0
+    cnes_ref_header = lookup_cnes_data("", estabelecimentos)
+    OUTPUT_FILE = os.path.join(pasta_saida or OUTPUT_DIR, f"oci_oftalmo_{competencia}.txt")
+
+    if catalogo_sigtap is not None and catalogo_sigtap.competencia not in ("", competencia):
+        print(f"Aviso: SIGTAP da competência {catalogo_sigtap.competencia} usado para a remessa {competencia}.")
+
+    lotes = [df_p] if isinstance(df_p, pd.DataFrame) else df_p
+    reservas = []
+    aceitos = []
+    cache = CacheRenderizacao(fp_cache) if fp_cache else None
+    indice = IndiceApac(fp_indice) if fp_indice else None
+    ocorrencias = {}
+    ocorrencias_indice = {}
+    apacs_usadas = set()
+    atribuicoes = []
+
+    gravada = False
+    try:
+        with EscritorRemessa(OUTPUT_FILE) as escritor:
+            for df_lote in lotes:
+                aceitos_lote, medicos_ref, cnes_refs, ultimo_cnes_ref = _validar_pacientes(
+                    df_lote, medicos, estabelecimentos, busca_aproximada, notificar_erro
+                )
+                if ultimo_cnes_ref is not None:
+                    cnes_ref_header = ultimo_cnes_ref
+                df_aceitos = df_lote.loc[aceitos_lote]
+                if catalogo_sigtap is not None:
+                    _verificar_sigtap(df_aceitos, catalogo_sigtap, cbo, notificar_erro)
+                _verificar_documentos(df_aceitos, medicos_ref, notificar_erro)
+
+                # Pacientes inalterados desde uma geração anterior saem prontos do
+                # cache, com a APAC que já receberam (desde que ela continue
+                # consumida no pool e não se repita nesta remessa).
+                reaproveitados = {}
+                if cache is not None:
+                    chaves = _numerar_ocorrencias(
+                        chaves_pacientes(df_aceitos, medicos_ref, cnes_refs, competencia, cbo), ocorrencias
+                    )
+                    achados = cache.buscar(chaves)
+                    for pos, chave in enumerate(chaves):
+                        achado = achados.get(chave)
+                        if achado and achado[0] not in apacs_usadas and not apac_disponivel(achado[0]):
+                            reaproveitados[pos] = achado
+                            apacs_usadas.add(achado[0])
+                faltam = [pos for pos in range(len(aceitos_lote)) if pos not in reaproveitados]
+
+                # Atendimentos que já receberam APAC numa geração anterior
+                # (mesmo paciente, data e procedimento) usam o mesmo número.
+                novas = [None] * len(faltam)
+                if indice is not None:
+                    atendimentos = _numerar_ocorrencias(_chaves_atendimentos(df_aceitos), ocorrencias_indice)
+                    atribuidas = indice.buscar(atendimentos[pos] for pos in faltam)
+                    for i, pos in enumerate(faltam):
+                        apac = atribuidas.get(atendimentos[pos])
+                        if apac and apac not in apacs_usadas and not apac_disponivel(apac):
+                            novas[i] = apac
+                            apacs_usadas.add(apac)
+
+                # Os números são reservados de uma vez por lote, só para os
+                # pacientes válidos e na ordem do CSV: pacientes rejeitados não
+                # gastam numeração e cada fatia do modo paralelo recebe um
+                # bloco contíguo da reserva.
+                sem_numero = novas.count(None)
+                reserva = reservar_apacs(sem_numero)
+                reservas.append(reserva)
+                if len(reserva) < sem_numero:
+                    raise Exception("Numerações APAC esgotadas.")
+                if sem_numero == len(novas):
+                    novas = list(reserva)
+                else:
+                    reservadas = iter(reserva)
+                    novas = [apac or next(reservadas) for apac in novas]
+
+                if len(faltam) < len(aceitos_lote):
+                    df_novos = df_aceitos.iloc[faltam]
+                    medicos_novos = [medicos_ref[pos] for pos in faltam]
+                    cnes_novos = [cnes_refs[pos] for pos in faltam]
+                else:
+                    df_novos, medicos_novos, cnes_novos = df_aceitos, medicos_ref, cnes_refs
+
+                if processos == 1 or len(faltam) <= TAMANHO_MIN_FATIA:
+                    renderizados = gerar_blocos_lote(df_novos, novas, medicos_novos, cnes_novos, competencia, cbo)
+                else:
+                    renderizados = _gerar_blocos_paralelo(df_novos, novas, medicos_novos, cnes_novos, competencia, cbo, processos)
+
+                if cache is not None:
+                    renderizados = list(renderizados)
+                    cache.gravar(((chaves[pos], apac, bloco) for pos, apac, bloco in zip(faltam, novas, renderizados)),
+                                 competencia)
+                    if reaproveitados:
+                        print(f"Cache: {len(reaproveitados)} paciente(s) reaproveitado(s), {len(faltam)} renderizado(s)")
+
+                renderizados = iter(renderizados)
+                novas = iter(novas)
+                for pos in range(len(aceitos_lote)):
+                    if pos in reaproveitados:
+                        apac, bloco = reaproveitados[pos]
+                    else:
+                        apac, bloco = next(novas), next(renderizados)
+                    if indice is not None:
+                        atribuicoes.append((atendimentos[pos], apac))
+                    escritor.escrever(bloco)
+                    total += 1
+                    primeira = primeira or apac
+                    ultima = apac
+
+                    if atualizar_status:
+                        atualizar_status(total)
+
+                aceitos.extend(aceitos_lote)
+                if indice is not None:
+                    indice.registrar(atribuicoes, competencia)
+                    atribuicoes.clear()
+
+            # o campo de controle foi somado pelo escritor à medida que os
+            # registros eram gravados
+            header_final = montar_cabecalho(competencia, cnes_ref_header, total, [], ultima, versao,
+                                            campo_controle=escritor.campo_controle())
+            # o consumo vai para o disco antes da remessa aparecer no destino:
+            # numa queda entre os dois, números se perdem mas nunca se repetem
+            salvar_numeracoes(fp_num_apac)
+            escritor.finalizar(header_final)
+            gravada = True
+    except BaseException:
+        if not gravada:
+            # remessa não gravada: todas as reservas voltam para o pool
+            for reserva in reversed(reservas):
+                devolver_reserva(reserva)
+            salvar_numeracoes(fp_num_apac)
+        for rotulo, base in (("Cache", cache), ("Índice", indice)):
+            if base is not None:
+                _encerrar_base(rotulo, base, confirmar=False)
+        raise
+
+    # A remessa já está no destino e a numeração dela, consumida: cada base
+    # é confirmada por conta própria e uma falha (ex.: "database is locked"
+    # no modo lote) só é avisada, sem devolver números ao pool.
+    for rotulo, base in (("Cache", cache), ("Índice", indice)):
+        if base is not None:
+            _encerrar_base(rotulo, base, confirmar=True)
+
+    salvar_relatorio_intervalo_apac(OUTPUT_FILE, primeira, ultima, nome_intervalo)
+    
+    return OUTPUT_FILE, total, primeira, ultima, aceitos
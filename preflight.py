@@ -0,0 +1,160 @@
+"""
+Pré-validação (preflight) do CSV de pacientes, sem gerar remessa.
+
+Confere a tabela inteira de uma vez, com operações vetorizadas do pandas,
+e grava um relatório com uma linha por paciente. Não inicializa nem toca
+o pool de numeração APAC e não grava remessa: serve para corrigir o CSV
+antes de gastar numeração e uma geração completa.
+
+Erros são o que faz o motor rejeitar o paciente (datas ausentes ou
+inválidas). Avisos são o que passa na geração mas sai com valor padrão ou
+tende a ser recusado no SIA: CEP sem 8 dígitos, sexo fora de M/F, CID
+ausente ou fora do formato, CPF ou Cartão SUS com dígito verificador
+errado, médico ou unidade não encontrados nas tabelas de referência,
+nascimento depois do atendimento.
+"""
+
+import os
+
+import pandas as pd
+
+from motor import DATA_DIR, OUTPUT_DIR
+from ingestao import (
+    ler_csv_pacientes, COLUNAS_PACIENTE, DATA_INVALIDA, coluna_texto, cid_serie, erros_datas
+)
+from referencias import carregar_referencias
+from utils import calcular_idade_serie, formatar_num_serie, validar_cpf_serie, validar_cns_serie
+
+SEXOS_VALIDOS = ("M", "F")
+
+# Letra + 2 dígitos + dígito ou "X" opcional (A00, H251, H52X)
+_RE_CID = r"^[A-Z][0-9]{2}[0-9X]?$"
+
+_SEPARADOR = "; "
+
+
+def _acrescentar(texto, problema, condicao):
+    """Acrescenta problema (texto fixo ou Series) às linhas em que condicao é verdadeira."""
+    if not isinstance(problema, pd.Series):
+        problema = pd.Series(problema, index=texto.index, dtype=object)
+    return texto + (_SEPARADOR + problema).where(condicao, "")
+
+
+def _resolvidos(nomes, tabela, busca_aproximada):
+    """True onde o nome é encontrado na tabela de referência (cada nome distinto buscado uma vez)."""
+    achados = {nome: tabela.buscar(nome, busca_aproximada) is not None for nome in nomes.unique() if nome}
+    return nomes.map(achados).fillna(False).astype(bool)
+
+
+def verificar_pacientes(df, medicos, estabelecimentos, busca_aproximada=False):
+    """
+    Relatório (DataFrame, uma linha por paciente de df, na mesma ordem) com
+    linha (no CSV, contando o cabeçalho), nome, situacao (OK, AVISO ou
+    ERRO), erros e avisos (problemas separados por "; ").
+    """
+    vazio = pd.Series("", index=df.index, dtype=object)
+    erros = vazio.copy()
+    avisos = vazio.copy()
+
+    nasc = coluna_texto(df, "Data_Nascimento")
+    cons = coluna_texto(df, "Data_Horario")
+    msgs_datas = erros_datas(nasc, cons)
+    erros = _acrescentar(erros, msgs_datas, msgs_datas != "")
+
+    datas_ok = nasc.ne(DATA_INVALIDA) & cons.ne(DATA_INVALIDA) & (msgs_datas == "")
+    nasc_depois = datas_ok & (nasc > cons)
+    avisos = _acrescentar(avisos, "data de nascimento posterior ao atendimento", nasc_depois)
+    idade = calcular_idade_serie(nasc, cons)
+    avisos = _acrescentar(avisos, "idade acima de 130 anos", datas_ok & (idade > 130))
+
+    nomes = coluna_texto(df, "Nome")
+    avisos = _acrescentar(avisos, "nome do paciente não informado", nomes.str.strip() == "")
+
+    cpf = formatar_num_serie(coluna_texto(df, "CPF"), 11)
+    avisos = _acrescentar(avisos, "CPF inválido: " + cpf, (cpf != "0" * 11) & ~validar_cpf_serie(cpf))
+    cns = formatar_num_serie(coluna_texto(df, "Cartão SUS"), 15)
+    avisos = _acrescentar(avisos, "Cartão SUS inválido: " + cns, (cns != "0" * 15) & ~validar_cns_serie(cns))
+
+    cep = coluna_texto(df, "CEP").str.replace(r"\D", "", regex=True)
+    avisos = _acrescentar(avisos, "CEP não informado", cep == "")
+    avisos = _acrescentar(avisos, "CEP com " + cep.str.len().astype(str) + " dígitos",
+                          (cep != "") & (cep.str.len() != 8))
+
+    sexo = coluna_texto(df, "Sexo").str.strip().str.upper()
+    # vazio sai como "I" (ignorado) na remessa
+    sem_sexo = sexo.isin(("", "I"))
+    avisos = _acrescentar(avisos, "sexo não informado", sem_sexo)
+    avisos = _acrescentar(avisos, "sexo inválido: '" + sexo + "'", ~sem_sexo & ~sexo.isin(SEXOS_VALIDOS))
+
+    cid = cid_serie(df)
+    avisos = _acrescentar(avisos, "CID não informado", cid == "")
+    avisos = _acrescentar(avisos, "CID fora do formato: '" + cid + "'", (cid != "") & ~cid.str.match(_RE_CID))
+
+    medico = coluna_texto(df, "Nome_Medico_Solicitante").str.strip().str.upper()
+    avisos = _acrescentar(avisos, "médico solicitante não informado", medico == "")
+    avisos = _acrescentar(avisos, "médico '" + medico + "' não encontrado em medicos.csv",
+                          (medico != "") & ~_resolvidos(medico, medicos, busca_aproximada))
+
+    unidade = coluna_texto(df, "Nome_Unidade_Solicitante").str.strip().str.upper()
+    avisos = _acrescentar(avisos, "unidade solicitante não informada", unidade == "")
+    avisos = _acrescentar(avisos, "unidade '" + unidade + "' não encontrada em estabelecimentos.csv",
+                          (unidade != "") & ~_resolvidos(unidade, estabelecimentos, busca_aproximada))
+
+    erros = erros.str.removeprefix(_SEPARADOR)
+    avisos = avisos.str.removeprefix(_SEPARADOR)
+    situacao = pd.Series("OK", index=df.index, dtype=object)
+    situacao = situacao.where(avisos == "", "AVISO").where(erros == "", "ERRO")
+
+    return pd.DataFrame({
+        "linha": df.index + 2,
+        "nome": nomes,
+        "situacao": situacao,
+        "erros": erros,
+        "avisos": avisos,
+    })
+
+
+def preflight(fp_pacientes, fp_medicos=None, fp_estab=None, busca_aproximada=False, fp_relatorio=None):
+    """
+    Lê e confere o CSV de pacientes e grava o relatório em fp_relatorio
+    (padrão: output/preflight_<nome do CSV>.csv, ";" e UTF-8 com BOM).
+    Retorna (relatorio, caminho do relatório, colunas ausentes no CSV).
+    Colunas obrigatórias ausentes levantam ValueError (ler_csv_pacientes).
+    """
+    FP_MEDICOS = fp_medicos or os.path.join(DATA_DIR, "medicos.csv")
+    FP_ESTAB = fp_estab or os.path.join(DATA_DIR, "estabelecimentos.csv")
+
+    df = ler_csv_pacientes(fp_pacientes)
+    ausentes = [c for c in COLUNAS_PACIENTE if c not in df.columns]
+    medicos, estabelecimentos = carregar_referencias(FP_MEDICOS, FP_ESTAB)
+
+    relatorio = verificar_pacientes(df, medicos, estabelecimentos, busca_aproximada)
+
+    if fp_relatorio is None:
+        nome = os.path.splitext(os.path.basename(fp_pacientes))[0]
+        fp_relatorio = os.path.join(OUTPUT_DIR, f"preflight_{nome}.csv")
+    pasta = os.path.dirname(fp_relatorio)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    relatorio.to_csv(fp_relatorio, sep=";", index=False, encoding="utf-8-sig")
+
+    return relatorio, fp_relatorio, ausentes
+
+
+def imprimir_resumo(relatorio, fp_relatorio, ausentes=()):
+    """Totais por situação e os problemas mais frequentes."""
+    contagem = relatorio["situacao"].value_counts()
+    print(f"Pacientes: {len(relatorio)}  OK: {contagem.get('OK', 0)}  "
+          f"AVISO: {contagem.get('AVISO', 0)}  ERRO: {contagem.get('ERRO', 0)}")
+    if ausentes:
+        print(f"Colunas ausentes no CSV: {', '.join(ausentes)}")
+    for rotulo, coluna in (("Erros", "erros"), ("Avisos", "avisos")):
+        problemas = relatorio[coluna][relatorio[coluna] != ""].str.split(_SEPARADOR).explode()
+        if problemas.empty:
+            continue
+        # agrupa pelo tipo do problema (sem o valor entre aspas)
+        tipos = problemas.str.replace(r"'[^']*'", "'…'", regex=True).str.replace(r": \S+$", "", regex=True)
+        print(f"{rotulo}:")
+        for tipo, n in tipos.value_counts().head(10).items():
+            print(f"  {n:>8}  {tipo}")
+    print(f"Relatório: {fp_relatorio}")
@@ -1,123 +1,73 @@
-from utils import (
-    formatar_num,
-    formatar_char,
-    sanitize_basic,
-    FIM_LINHA
-)
+from functools import lru_cache
 
-from utils import selecionar_procedimento, MAPA_PROCEDIMENTOS_OFTALMO
+from utils import faixa_procedimento, formatar_num, MAPA_PROCEDIMENTOS_OFTALMO
 
+from layout import LAYOUT_REGISTRO_13, CBO_PADRAO
 
-def montar_procedimento(competencia, apac_numero, cod_proc, qtd, cnes_terceiro):
+# Catálogo compilado: para cada faixa (chave do procedimento principal em
+# MAPA_PROCEDIMENTOS_OFTALMO), as linhas do bloco na ordem de gravação, como
+# (código, quantidade, leva CNES terceiro). O principal vem primeiro, sem
+# CNES terceiro.
+CATALOGO_PROCEDIMENTOS = {
+    cod_principal: ((cod_principal, "1", False),)
+    + tuple((proc["cod"], proc["qtd"], True) for proc in dados["secundarios"])
+    for cod_principal, dados in MAPA_PROCEDIMENTOS_OFTALMO.items()
+}
+
+# Indicador + competência + APAC: o único trecho do Registro 13 que muda
+# de paciente para paciente.
+_FIM_CABECA_13 = LAYOUT_REGISTRO_13.fatia("apac_numero").stop
+
+
+def montar_procedimento(competencia, apac_numero, cod_proc, qtd, cnes_terceiro, cbo=CBO_PADRAO):
     """
     Registro 13 – Procedimentos/Ações Realizadas.
     Tamanho total: 99 caracteres (incluindo CRLF do campo FIM).
 
     O CRLF faz parte do campo 16, então ELE entra na contagem.
+    Campos e larguras em layout.CAMPOS_REGISTRO_13 (CBO padrão 225265).
     """
 
-    competencia = sanitize_basic(competencia)
-    apac_numero = sanitize_basic(apac_numero)
-    cod_proc = sanitize_basic(cod_proc).replace("-", "")
-    qtd = sanitize_basic(qtd)
-    cnes_terceiro = sanitize_basic(cnes_terceiro)
-
-    CBO = "225265"
-
-    r = ""
-
-    # 1. Indicador
-    r += "13"
-
-    # 2. Competência
-    r += formatar_num(competencia, 6)
-
-    # 3. APAC
-    r += formatar_num(apac_numero, 13)
-
-    # 4. Procedimento
-    r += formatar_num(cod_proc, 10)
-
-    # 5. CBO
-    r += formatar_num(CBO, 6)
-
-    # 6. Quantidade
-    r += formatar_num(qtd, 7)
-
-    # 7. CNPJ cessão – espaços
-    r += formatar_char("", 14)
-
-    # 8. Nº NF – espaços
-    r += formatar_char("", 6)
-
-    # 9. CID principal – espaços
-    r += formatar_char("", 4)
-
-    # 10. CID secundário – espaços
-    r += formatar_char("", 4)
+    return LAYOUT_REGISTRO_13.montar({
+        "competencia": competencia,
+        "apac_numero": apac_numero,
+        "cod_proc": cod_proc,
+        "cbo": cbo,
+        "qtd": qtd,
+        "cnes_terceiro": cnes_terceiro,
+    })
 
-    # 11. Serviço – espaços
-    r += formatar_char("", 3)
 
-    # 12. Classificação – espaços
-    r += formatar_char("", 3)
-
-    # 13. Sequência equipe – espaços
-    r += formatar_char("", 8)
-
-    # 14. Área equipe – espaços
-    r += formatar_char("", 4)
-
-    # 15. CNES terceiro
-    r += formatar_char(cnes_terceiro, 7)
-
-    # 16. FIM (faz parte do registro!)
-    r += "\r\n"
+@lru_cache(maxsize=None)
+def _sufixos_procedimentos(faixa, cnes_terceiro, cbo):
+    """
+    Registros 13 da faixa já montados, sem a cabeça (indicador, competência
+    e APAC). Montados uma vez por (faixa, CNES terceiro, CBO).
+    """
+    return tuple(
+        montar_procedimento("", "", cod, qtd, cnes_terceiro if terceiro else "", cbo)[_FIM_CABECA_13:]
+        for cod, qtd, terceiro in CATALOGO_PROCEDIMENTOS[faixa]
+    )
 
-    # -------------------------------------------------------
-    # VALIDAÇÃO FINAL — Registro tem que ter EXATAMENTE 99
-    # -------------------------------------------------------
-    if len(r) != 99:
-        raise ValueError(
-            f"Registro 13 com tamanho inválido: {len(r)} (esperado 99)"
-        )
 
-    return r
+def _cabeca_procedimento(competencia, apac_numero):
+    return "13" + formatar_num(competencia, 6) + formatar_num(apac_numero, 13)
 
 
-def gerar_bloco_procedimentos(idade, competencia, apac_numero, cnes_terceiro):
+def gerar_bloco_procedimentos(idade, competencia, apac_numero, cnes_terceiro, cbo=CBO_PADRAO):
     """
     Gera:
         - 1 procedimento principal
         - N procedimentos secundários
     """
+    cabeca = _cabeca_procedimento(competencia, apac_numero)
+    return [cabeca + sufixo for sufixo in _sufixos_procedimentos(faixa_procedimento(idade), cnes_terceiro, cbo)]
 
-    proc_sel = selecionar_procedimento(idade)
 
-    cod_principal = next(
-        key for key, value in MAPA_PROCEDIMENTOS_OFTALMO.items()
-        if value == proc_sel
-    )
-
-    linhas = []
-
-    # Procedimento principal
-    linhas.append(
-        montar_procedimento(
-            competencia, apac_numero, cod_principal, "1", ""
-        )
-    )
-
-    # Procedimentos secundários
-    for proc in proc_sel["secundarios"]:
-        linhas.append(
-            montar_procedimento(
-                competencia,
-                apac_numero,
-                proc["cod"],
-                proc["qtd"],
-                cnes_terceiro
-            )
-        )
-
-    return linhas
+def montar_bloco_procedimentos(faixa, competencia, apac_numero, cnes_terceiro, cbo=CBO_PADRAO):
+    """
+    Bloco de Registros 13 da faixa como uma única string (mesmo conteúdo de
+    gerar_bloco_procedimentos).
+    """
+    cabeca = _cabeca_procedimento(competencia, apac_numero)
+    return cabeca + cabeca.join(_sufixos_procedimentos(faixa, cnes_terceiro, cbo))
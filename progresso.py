@@ -0,0 +1,51 @@
+"""
+Progresso da geração com frequência limitada.
+
+O motor chama atualizar_status(n) a cada paciente gravado; repassar cada
+chamada para a interface enche a fila de eventos em arquivos grandes.
+ProgressoLimitado fica no lugar de atualizar_status e só repassa uma
+atualização a cada `intervalo` segundos ou `a_cada` pacientes (o que vier
+primeiro), já com a taxa (pacientes/s) e o tempo restante estimado.
+"""
+
+import time
+
+
+class ProgressoLimitado:
+    """
+    Use a instância como atualizar_status do motor. ao_atualizar(n, total,
+    taxa, restante) recebe o total de pacientes gerados, o total esperado,
+    a taxa média em pacientes/s e a estimativa de segundos restantes
+    (None enquanto não há taxa). A última chamada (n == total) sempre passa.
+    """
+
+    def __init__(self, total, ao_atualizar, intervalo=0.1, a_cada=None, relogio=time.monotonic):
+        self.total = max(1, total)
+        self.ao_atualizar = ao_atualizar
+        self.intervalo = intervalo
+        self.a_cada = a_cada
+        self.relogio = relogio
+        self.inicio = relogio()
+        self._ultimo_envio = self.inicio
+        self._ultimo_n = 0
+
+    def __call__(self, n):
+        agora = self.relogio()
+        if (n < self.total
+                and agora - self._ultimo_envio < self.intervalo
+                and (self.a_cada is None or n - self._ultimo_n < self.a_cada)):
+            return
+        self._ultimo_envio = agora
+        self._ultimo_n = n
+        decorrido = agora - self.inicio
+        taxa = n / decorrido if decorrido > 0 else 0.0
+        restante = max(0.0, (self.total - n) / taxa) if taxa else None
+        self.ao_atualizar(n, self.total, taxa, restante)
+
+
+def formatar_duracao(segundos):
+    """Segundos como 'H:MM:SS' (ou 'M:SS' abaixo de uma hora)."""
+    segundos = int(round(segundos))
+    h, resto = divmod(segundos, 3600)
+    m, s = divmod(resto, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
@@ -0,0 +1,293 @@
+"""
+Tabelas de referência (médicos, estabelecimentos) com índice de nomes.
+
+A busca por nome segue a regra de sempre — primeira linha da tabela cujo nome
+contém o texto procurado — mas sem varrer a tabela inteira a cada paciente:
+os nomes são normalizados uma vez (maiúsculas, sem acento, espaços
+simples) e indexados por palavra. Cada consulta distinta é resolvida uma
+única vez e memorizada.
+
+As tabelas já montadas (com índice) ficam em memória entre execuções no
+mesmo processo e também num snapshot binário ao lado do CSV
+("medicos.csv.cache"); o CSV só é lido de novo quando muda (mtime/tamanho
+e, na dúvida, o hash do conteúdo).
+"""
+
+import os
+import bisect
+import difflib
+import hashlib
+import pickle
+import threading
+import unicodedata
+
+import pandas as pd
+
+from utils import sanitize_basic, validar_cns_serie
+
+
+def normalizar_nome(valor):
+    """
+    Maiúsculas, sem acentos e com espaços simples: 'José  da Silva' -> 'JOSE DA SILVA'.
+    """
+    s = unicodedata.normalize("NFKD", sanitize_basic(valor))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.upper().split())
+
+
+class IndiceNomes:
+    """
+    Índice de palavras sobre uma lista de nomes (na ordem da tabela).
+
+    buscar(texto) devolve a posição da primeira linha cujo nome normalizado
+    contém o texto normalizado, ou None. Como o texto pode começar no meio de
+    uma palavra e terminar no meio de outra, a primeira palavra da consulta
+    é procurada como sufixo, a última como prefixo e as do meio como
+    palavras inteiras; os candidatos são então conferidos por substring.
+    """
+
+    def __init__(self, nomes):
+        self.nomes = [normalizar_nome(n) for n in nomes]
+        self._linhas_por_palavra = {}
+        for pos, nome in enumerate(self.nomes):
+            for palavra in set(nome.split()):
+                self._linhas_por_palavra.setdefault(palavra, []).append(pos)
+        self._vocabulario = sorted(self._linhas_por_palavra)
+        self._invertido = sorted(p[::-1] for p in self._vocabulario)
+        self._cache = {}
+        self._cache_aprox = {}
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def _linhas(self, palavras):
+        linhas = set()
+        for p in palavras:
+            linhas.update(self._linhas_por_palavra[p])
+        return linhas
+
+    def _com_prefixo(self, prefixo):
+        i = bisect.bisect_left(self._vocabulario, prefixo)
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(prefixo):
+            yield self._vocabulario[i]
+            i += 1
+
+    def _com_sufixo(self, sufixo):
+        invertido = sufixo[::-1]
+        i = bisect.bisect_left(self._invertido, invertido)
+        while i < len(self._invertido) and self._invertido[i].startswith(invertido):
+            yield self._invertido[i][::-1]
+            i += 1
+
+    def _candidatos(self, consulta):
+        palavras = consulta.split(" ")
+        if len(palavras) == 1:
+            return self._linhas(p for p in self._vocabulario if consulta in p)
+
+        restricoes = []
+        for palavra in palavras[1:-1]:
+            if palavra not in self._linhas_por_palavra:
+                return set()
+            restricoes.append(set(self._linhas_por_palavra[palavra]))
+        restricoes.append(self._linhas(self._com_sufixo(palavras[0])))
+        restricoes.append(self._linhas(self._com_prefixo(palavras[-1])))
+        restricoes.sort(key=len)
+        return set.intersection(*restricoes)
+
+    def buscar(self, texto):
+        consulta = normalizar_nome(texto)
+        if not consulta:
+            return None
+        if consulta not in self._cache:
+            achado = None
+            for pos in sorted(self._candidatos(consulta)):
+                if consulta in self.nomes[pos]:
+                    achado = pos
+                    break
+            self._cache[consulta] = achado
+        return self._cache[consulta]
+
+    def buscar_aproximado(self, texto, corte=0.85):
+        """
+        Como buscar(), mas quando não há correspondência exata devolve o nome
+        mais parecido (difflib) com similaridade >= corte.
+        """
+        pos = self.buscar(texto)
+        if pos is not None:
+            return pos
+        consulta = normalizar_nome(texto)
+        if not consulta:
+            return None
+        chave = (consulta, corte)
+        if chave not in self._cache_aprox:
+            parecidos = difflib.get_close_matches(consulta, self.nomes, n=1, cutoff=corte)
+            self._cache_aprox[chave] = self.nomes.index(parecidos[0]) if parecidos else None
+        return self._cache_aprox[chave]
+
+
+class TabelaReferencia:
+    """
+    Tabela de referência carregada em memória, com índice sobre a coluna de nome.
+
+    As colunas ficam como listas (acesso O(1) por linha). resultados é um
+    dicionário livre para as funções de lookup memorizarem o que já
+    resolveram para cada valor distinto de entrada.
+    """
+
+    def __init__(self, df, coluna_nome):
+        self.colunas = {str(c): df[c].tolist() for c in df.columns}
+        self.coluna_nome = coluna_nome
+        self.indice = IndiceNomes(self.colunas.get(coluna_nome, []))
+        self.resultados = {}
+
+    def __len__(self):
+        return len(self.indice)
+
+    def buscar(self, nome, aproximado=False):
+        """Primeira linha (dict) cujo nome contém `nome`, ou None."""
+        if aproximado:
+            pos = self.indice.buscar_aproximado(nome)
+        else:
+            pos = self.indice.buscar(nome)
+        if pos is None:
+            return None
+        return {c: valores[pos] for c, valores in self.colunas.items()}
+
+
+# ====================================================
+# CACHE EM MEMÓRIA + SNAPSHOT EM DISCO
+# ====================================================
+
+VERSAO_SNAPSHOT = 1
+SUFIXO_SNAPSHOT = ".cache"
+
+_CACHE_TABELAS = {}
+_LOCK_CACHE = threading.Lock()
+
+
+def _assinatura(fp):
+    st = os.stat(fp)
+    return st.st_mtime_ns, st.st_size
+
+
+def _hash_arquivo(fp):
+    h = hashlib.sha1()
+    with open(fp, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _ler_snapshot(fp_snap):
+    try:
+        with open(fp_snap, "rb") as f:
+            snap = pickle.load(f)
+        if snap.get("versao") == VERSAO_SNAPSHOT:
+            return snap
+    except Exception:
+        pass
+    return None
+
+
+def _gravar_snapshot(fp_snap, snap):
+    tmp = f"{fp_snap}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fp_snap)
+    except Exception as e:
+        print(f"Aviso: não foi possível gravar snapshot {fp_snap}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _avisar_cartoes_invalidos(df, fp, coluna_nome):
+    """Avisa (sem recusar) as linhas com Cartão SUS de dígito verificador errado."""
+    if "cartao_sus" not in df.columns:
+        return
+    invalidos = ~validar_cns_serie(df["cartao_sus"])
+    if invalidos.any():
+        linhas = (df.index[invalidos.to_numpy()] + 2).tolist()
+        exemplos = ", ".join(map(str, linhas[:5])) + (", ..." if len(linhas) > 5 else "")
+        print(f"Aviso: {len(linhas)} linha(s) com Cartão SUS inválido em {fp} (linhas {exemplos})")
+
+
+def _carregar_do_disco(fp, coluna_nome, assinatura):
+    fp_snap = fp + SUFIXO_SNAPSHOT
+    snap = _ler_snapshot(fp_snap)
+
+    if snap and snap["coluna_nome"] == coluna_nome:
+        if snap["assinatura"] == assinatura:
+            return snap["tabela"], snap["hash"]
+        # mtime/tamanho mudaram: só relê o CSV se o conteúdo mudou de fato
+        digest = _hash_arquivo(fp)
+        if snap["hash"] == digest:
+            snap["assinatura"] = assinatura
+            _gravar_snapshot(fp_snap, snap)
+            return snap["tabela"], digest
+    else:
+        digest = _hash_arquivo(fp)
+
+    df = pd.read_csv(fp, delimiter=";")
+    _avisar_cartoes_invalidos(df, fp, coluna_nome)
+    tabela = TabelaReferencia(df, coluna_nome)
+    _gravar_snapshot(fp_snap, {
+        "versao": VERSAO_SNAPSHOT,
+        "coluna_nome": coluna_nome,
+        "assinatura": assinatura,
+        "hash": digest,
+        "tabela": tabela,
+    })
+    print(f"Referência carregada do CSV: {fp} ({len(tabela)} linhas)")
+    return tabela, digest
+
+
+def carregar_tabela_referencia(fp, coluna_nome):
+    """
+    TabelaReferencia do CSV `fp`, reaproveitando a versão já carregada em
+    memória ou o snapshot em disco enquanto o arquivo não mudar.
+    Arquivo inexistente vira tabela vazia (como antes).
+    """
+    if not fp or not os.path.exists(fp):
+        return TabelaReferencia(pd.DataFrame(), coluna_nome)
+
+    chave = (os.path.abspath(fp), coluna_nome)
+    assinatura = _assinatura(fp)
+    with _LOCK_CACHE:
+        atual = _CACHE_TABELAS.get(chave)
+        if atual and atual[0] == assinatura:
+            return atual[2]
+
+    tabela, digest = _carregar_do_disco(fp, coluna_nome, assinatura)
+
+    with _LOCK_CACHE:
+        atual = _CACHE_TABELAS.get(chave)
+        if atual and atual[1] == digest:
+            # conteúdo igual ao que já estava em memória: mantém a tabela
+            # (e os lookups já memorizados nela)
+            tabela = atual[2]
+        _CACHE_TABELAS[chave] = (assinatura, digest, tabela)
+    return tabela
+
+
+def carregar_referencias(fp_medicos, fp_estab):
+    """
+    (medicos, estabelecimentos) como TabelaReferencia, indexadas por
+    nome_completo e desc_solicitante.
+    """
+    return (
+        carregar_tabela_referencia(fp_medicos, "nome_completo"),
+        carregar_tabela_referencia(fp_estab, "desc_solicitante"),
+    )
+
+
+def aquecer_referencias(fp_medicos, fp_estab):
+    """
+    Pré-carrega as tabelas em memória (ex.: ao abrir a janela), para que a
+    primeira geração não pague a leitura dos CSVs.
+    """
+    try:
+        carregar_referencias(fp_medicos, fp_estab)
+    except Exception as e:
+        print(f"Aviso: falha ao pré-carregar referências: {e}")
+
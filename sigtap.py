@@ -0,0 +1,197 @@
+"""
+Tabela de procedimentos do SIGTAP (Tabela Unificada) para conferência dos
+Registros 13 antes do envio ao SIA.
+
+Lê da pasta da competência baixada do DATASUS (arquivos de largura fixa com
+seus "_layout.txt"):
+    tb_procedimento.txt          — sexo, idade mínima/máxima (em meses) e
+                                   quantidade máxima de cada procedimento
+    rl_procedimento_ocupacao.txt — CBOs compatíveis com cada procedimento
+    rl_procedimento_cid.txt      — CIDs aceitos por procedimento
+
+Tudo vira dicionários indexados pelo código do procedimento (consulta O(1))
+e o resultado fica num snapshot binário na própria pasta ("sigtap.cache"),
+refeito só quando algum dos arquivos muda.
+"""
+
+import os
+import pickle
+
+from utils import sanitize_numeric
+
+ARQUIVO_SNAPSHOT = "sigtap.cache"
+VERSAO_SNAPSHOT = 1
+
+ARQUIVOS_SIGTAP = ("tb_procedimento.txt", "rl_procedimento_ocupacao.txt", "rl_procedimento_cid.txt")
+
+# Posições (início, fim; base 1, como nos _layout.txt) usadas quando o
+# arquivo de layout não acompanha a tabela.
+LAYOUTS_PADRAO = {
+    "tb_procedimento.txt": {
+        "CO_PROCEDIMENTO": (1, 10),
+        "TP_SEXO": (262, 262),
+        "QT_MAXIMA_EXECUCAO": (263, 266),
+        "VL_IDADE_MINIMA": (275, 278),
+        "VL_IDADE_MAXIMA": (279, 282),
+        "DT_COMPETENCIA": (331, 336),
+    },
+    "rl_procedimento_ocupacao.txt": {
+        "CO_PROCEDIMENTO": (1, 10),
+        "CO_OCUPACAO": (11, 16),
+    },
+    "rl_procedimento_cid.txt": {
+        "CO_PROCEDIMENTO": (1, 10),
+        "CO_CID": (11, 14),
+    },
+}
+
+# Idade máxima que, no SIGTAP, significa "sem limite"
+IDADE_SEM_LIMITE = 9999
+
+
+class CatalogoSigtap:
+    """
+    Restrições do SIGTAP por procedimento (código de 10 dígitos, com DV).
+
+    procedimentos: código -> (sexo, idade_min_meses, idade_max_meses, qtd_max)
+    ocupacoes:     código -> frozenset de CBOs compatíveis (ausente = sem restrição)
+    cids:          código -> frozenset de CIDs aceitos (ausente = sem restrição)
+    """
+
+    def __init__(self, competencia, procedimentos, ocupacoes, cids):
+        self.competencia = competencia
+        self.procedimentos = procedimentos
+        self.ocupacoes = ocupacoes
+        self.cids = cids
+
+    def __len__(self):
+        return len(self.procedimentos)
+
+    def verificar(self, cod_proc, qtd, cbo, idade_meses, sexo, cid):
+        """
+        Problemas de compatibilidade de um Registro 13 (lista vazia = ok).
+        sexo é "M", "F" ou outro valor (não conferido); cid vazio não é conferido.
+        """
+        cod = sanitize_numeric(cod_proc)
+        regras = self.procedimentos.get(cod)
+        if regras is None:
+            return [f"procedimento {cod} não existe no SIGTAP {self.competencia}"]
+
+        problemas = []
+        sexo_proc, idade_min, idade_max, qtd_max = regras
+        cbos = self.ocupacoes.get(cod)
+        if cbos and cbo not in cbos:
+            problemas.append(f"CBO {cbo} incompatível com o procedimento {cod}")
+        if idade_meses < idade_min or (idade_max < IDADE_SEM_LIMITE and idade_meses > idade_max):
+            problemas.append(f"idade ({idade_meses} meses) fora da faixa do procedimento {cod} ({idade_min}-{idade_max} meses)")
+        if sexo_proc in ("M", "F") and sexo in ("M", "F") and sexo != sexo_proc:
+            problemas.append(f"procedimento {cod} restrito ao sexo {sexo_proc}")
+        if qtd_max and int(sanitize_numeric(qtd) or 0) > qtd_max:
+            problemas.append(f"quantidade {qtd} acima do máximo ({qtd_max}) do procedimento {cod}")
+        cids = self.cids.get(cod)
+        if cid and cids and cid not in cids:
+            problemas.append(f"CID {cid} não aceito pelo procedimento {cod}")
+        return problemas
+
+
+def _ler_layout(pasta, arquivo):
+    """Posições das colunas pelo "<tabela>_layout.txt" (Coluna,Tamanho,Inicio,Fim,Tipo)."""
+    fp_layout = os.path.join(pasta, arquivo.replace(".txt", "_layout.txt"))
+    if not os.path.exists(fp_layout):
+        return LAYOUTS_PADRAO[arquivo]
+    posicoes = {}
+    with open(fp_layout, "r", encoding="latin1") as f:
+        f.readline()
+        for linha in f:
+            partes = linha.strip().split(",")
+            if len(partes) >= 4 and partes[2].isdigit() and partes[3].isdigit():
+                posicoes[partes[0].upper()] = (int(partes[2]), int(partes[3]))
+    return posicoes
+
+
+def _colunas(pasta, arquivo, nomes):
+    """Gera, para cada linha da tabela, a tupla das colunas pedidas (sem espaços)."""
+    posicoes = _ler_layout(pasta, arquivo)
+    fatias = [slice(posicoes[n][0] - 1, posicoes[n][1]) for n in nomes]
+    with open(os.path.join(pasta, arquivo), "r", encoding="latin1") as f:
+        for linha in f:
+            if linha.strip():
+                yield tuple(linha[s].strip() for s in fatias)
+
+
+def _inteiro(valor, padrao=0):
+    return int(valor) if valor.isdigit() else padrao
+
+
+def _ler_tabelas(pasta):
+    procedimentos = {}
+    competencia = ""
+    for cod, sexo, qtd_max, idade_min, idade_max, cmp in _colunas(
+        pasta, "tb_procedimento.txt",
+        ("CO_PROCEDIMENTO", "TP_SEXO", "QT_MAXIMA_EXECUCAO", "VL_IDADE_MINIMA", "VL_IDADE_MAXIMA", "DT_COMPETENCIA")
+    ):
+        procedimentos[cod] = (sexo, _inteiro(idade_min), _inteiro(idade_max, IDADE_SEM_LIMITE), _inteiro(qtd_max))
+        competencia = competencia or cmp
+
+    ocupacoes = {}
+    for cod, cbo in _colunas(pasta, "rl_procedimento_ocupacao.txt", ("CO_PROCEDIMENTO", "CO_OCUPACAO")):
+        ocupacoes.setdefault(cod, set()).add(cbo)
+
+    cids = {}
+    fp_cid = os.path.join(pasta, "rl_procedimento_cid.txt")
+    if os.path.exists(fp_cid):
+        for cod, cid in _colunas(pasta, "rl_procedimento_cid.txt", ("CO_PROCEDIMENTO", "CO_CID")):
+            cids.setdefault(cod, set()).add(cid)
+
+    return CatalogoSigtap(
+        competencia,
+        procedimentos,
+        {cod: frozenset(v) for cod, v in ocupacoes.items()},
+        {cod: frozenset(v) for cod, v in cids.items()},
+    )
+
+
+def _assinaturas(pasta):
+    assinaturas = []
+    for arquivo in ARQUIVOS_SIGTAP:
+        for nome in (arquivo, arquivo.replace(".txt", "_layout.txt")):
+            fp = os.path.join(pasta, nome)
+            if os.path.exists(fp):
+                st = os.stat(fp)
+                assinaturas.append((nome, st.st_mtime_ns, st.st_size))
+    return tuple(assinaturas)
+
+
+def carregar_sigtap(pasta):
+    """
+    CatalogoSigtap da pasta de uma competência do SIGTAP, pelo snapshot
+    quando os arquivos não mudaram. Levanta FileNotFoundError se faltar
+    tb_procedimento.txt ou rl_procedimento_ocupacao.txt.
+    """
+    for arquivo in ARQUIVOS_SIGTAP[:2]:
+        if not os.path.exists(os.path.join(pasta, arquivo)):
+            raise FileNotFoundError(f"Arquivo do SIGTAP não encontrado: {os.path.join(pasta, arquivo)}")
+
+    assinaturas = _assinaturas(pasta)
+    fp_snap = os.path.join(pasta, ARQUIVO_SNAPSHOT)
+    try:
+        with open(fp_snap, "rb") as f:
+            snap = pickle.load(f)
+        if snap.get("versao") == VERSAO_SNAPSHOT and snap.get("assinaturas") == assinaturas:
+            return snap["catalogo"]
+    except Exception:
+        pass
+
+    catalogo = _ler_tabelas(pasta)
+    tmp = f"{fp_snap}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump({"versao": VERSAO_SNAPSHOT, "assinaturas": assinaturas, "catalogo": catalogo},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fp_snap)
+    except Exception as e:
+        print(f"Aviso: não foi possível gravar snapshot {fp_snap}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    print(f"SIGTAP {catalogo.competencia} carregado de {pasta} ({len(catalogo)} procedimentos)")
+    return catalogo
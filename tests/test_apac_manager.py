@@ -0,0 +1,85 @@
+import apac_manager
+from apac_manager import PoolApac, formatar_apac
+
+
+def test_base_com_zero_a_esquerda_mantem_13_digitos():
+    base = 12345678901  # 11 dígitos: a base de 12 começa com zero
+    apac = formatar_apac(base)
+    assert apac == "0123456789016"
+
+    pool = PoolApac([apac, formatar_apac(base + 1)])
+    assert list(pool) == ["0123456789016", "0123456789027"]
+    assert pool.intervalos() == [("0123456789016", "0123456789027")]
+    assert pool.consumir() == "0123456789016"
+    assert pool.contem("0123456789027")
+
+
+def _arquivo_numeracao(caminho, bases):
+    with open(caminho, "w", encoding="latin1") as f:
+        f.write("NUMERAÇÃO APAC\n")
+        for base in bases:
+            apac = formatar_apac(base)
+            f.write(f"{apac[:12]}-{apac[12]}\n")
+    return str(caminho)
+
+
+def test_acrescimo_ao_arquivo_de_numeracao_nao_reemite_consumidas(tmp_path):
+    fp = _arquivo_numeracao(tmp_path / "num.txt", range(352570605000, 352570605010))
+    apac_manager.inicializar_manager(fp)
+    consumidas = list(apac_manager.reservar_apacs(4))
+    apac_manager.salvar_numeracoes(fp)
+
+    # o operador acrescenta uma faixa nova ao arquivo entre duas gerações
+    with open(fp, "a", encoding="latin1") as f:
+        apac = formatar_apac(352570609000)
+        f.write(f"{apac[:12]}-{apac[12]}\n")
+
+    apac_manager.inicializar_manager(fp)
+    assert len(apac_manager.NUMERACOES_APAC_MEMORIA) == 7
+    for apac in consumidas:
+        assert not apac_manager.apac_disponivel(apac)
+    assert apac_manager.contar_numeracoes_disponiveis(fp) == 7
+
+    # e continua valendo numa terceira execução
+    apac_manager.inicializar_manager(fp)
+    assert list(apac_manager.reservar_apacs(1)) == [formatar_apac(352570605004)]
+
+
+def test_reservar_e_devolver_reserva_preservam_ordem():
+    avulso = "ABC"
+    pool = PoolApac([formatar_apac(b) for b in range(100, 104)] + [avulso] + [formatar_apac(b) for b in (200, 201)])
+    original = list(pool)
+
+    reserva = pool.reservar(6)
+    assert list(reserva) == original[:6]
+    assert list(pool) == original[6:]
+    assert len(pool) == 1
+
+    reserva.consumir()  # o primeiro número foi usado
+    pool.devolver_reserva(reserva)
+    assert list(pool) == original[1:]
+    assert len(pool) == len(original) - 1
+    assert len(reserva) == 0
+    # intervalos voltam a se juntar
+    assert pool.intervalos()[0] == (formatar_apac(101), formatar_apac(103))
+
+
+def test_diario_reaplicado_depois_de_queda(tmp_path):
+    fp = _arquivo_numeracao(tmp_path / "num.txt", range(352570605000, 352570605010))
+    apac_manager.inicializar_manager(fp)
+    reserva = apac_manager.reservar_apacs(5)
+    usadas = [reserva.consumir() for _ in range(2)]
+    apac_manager.devolver_reserva(reserva)
+    apac_manager.salvar_numeracoes(fp)
+
+    # queda no meio da gravação da próxima linha do diário
+    with open(fp + apac_manager.SUFIXO_DIARIO, "a", encoding="ascii") as f:
+        f.write(f"C {formatar_apac(352570605002)}")
+
+    # o arquivo base não foi regravado: só o diário guarda o consumo
+    assert len(list(apac_manager._numeracoes_do_arquivo(fp))) == 10
+
+    apac_manager.inicializar_manager(fp)
+    assert len(apac_manager.NUMERACOES_APAC_MEMORIA) == 8
+    assert not any(apac_manager.apac_disponivel(a) for a in usadas)
+    assert list(apac_manager.reservar_apacs(1)) == [formatar_apac(352570605002)]
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import apac_manager
+import motor
+from apac_manager import formatar_apac
+from cache_remessa import CacheRenderizacao
+from escritor import EscritorRemessa
+from indice_apac import IndiceApac
+from ingestao import ler_csv_pacientes
+from referencias import TabelaReferencia
+
+COMPETENCIA = "202510"
+BASES = range(352570605000, 352570605010)
+
+
+@pytest.fixture
+def ambiente(tmp_path):
+    fp_num = tmp_path / "num.txt"
+    with open(fp_num, "w", encoding="latin1") as f:
+        f.write("NUMERAÇÃO APAC\n")
+        for base in BASES:
+            apac = formatar_apac(base)
+            f.write(f"{apac[:12]}-{apac[12]}\n")
+
+    fp_pacientes = tmp_path / "pacientes.csv"
+    with open(fp_pacientes, "w", encoding="utf-8") as f:
+        f.write("Data/Horário;Nome;CPF;Data de Nascimento;Sexo;Profissional;Unidade;Cartão SUS\n")
+        for i in range(3):
+            f.write(f"16/10/2025 14:00;PACIENTE {i};5299822472{i};05/10/1948;F;ANA;POSTO;\n")
+
+    medicos = TabelaReferencia(pd.DataFrame({"cartao_sus": ["702102761750292"], "nome_completo": ["ANA"]}),
+                               "nome_completo")
+    estabelecimentos = TabelaReferencia(
+        pd.DataFrame({"cod_solicitante": ["1234567"], "desc_solicitante": ["POSTO"]}), "desc_solicitante")
+
+    apac_manager.inicializar_manager(str(fp_num))
+    return {
+        "fp_num": str(fp_num),
+        "df": ler_csv_pacientes(str(fp_pacientes)),
+        "medicos": medicos,
+        "estabelecimentos": estabelecimentos,
+        "saida": str(tmp_path / "saida"),
+        "tmp": tmp_path,
+    }
+
+
+def _gerar(amb, **opcoes):
+    os.makedirs(amb["saida"], exist_ok=True)
+    return motor.gerar_remessa(amb["df"], COMPETENCIA, "TESTE", amb["medicos"], amb["estabelecimentos"],
+                               fp_num_apac=amb["fp_num"], pasta_saida=amb["saida"], **opcoes)
+
+
+def _falhar(*args, **kwargs):
+    raise sqlite3.OperationalError("database is locked")
+
+
+def test_falha_ao_finalizar_devolve_as_reservas(ambiente, monkeypatch):
+    monkeypatch.setattr(EscritorRemessa, "finalizar", _falhar)
+    with pytest.raises(sqlite3.OperationalError):
+        _gerar(ambiente)
+
+    assert not os.path.exists(os.path.join(ambiente["saida"], f"oci_oftalmo_{COMPETENCIA}.txt"))
+    assert len(apac_manager.NUMERACOES_APAC_MEMORIA) == len(BASES)
+    # e o diário também registrou a devolução
+    apac_manager.inicializar_manager(ambiente["fp_num"])
+    assert list(apac_manager.reservar_apacs(1)) == [formatar_apac(BASES[0])]
+
+
+def test_falha_ao_confirmar_cache_mantem_numeracao_e_indice(ambiente, monkeypatch):
+    fp_cache = str(ambiente["tmp"] / "cache.db")
+    fp_indice = str(ambiente["tmp"] / "indice.db")
+    monkeypatch.setattr(CacheRenderizacao, "confirmar", _falhar)
+
+    arquivo, total, primeira, ultima, _ = _gerar(ambiente, fp_cache=fp_cache, fp_indice=fp_indice)
+
+    assert os.path.exists(arquivo)
+    assert total == 3
+    # os números da remessa gravada continuam consumidos
+    assert len(apac_manager.NUMERACOES_APAC_MEMORIA) == len(BASES) - 3
+    assert not apac_manager.apac_disponivel(primeira)
+    # o índice foi confirmado mesmo com a falha do cache
+    with IndiceApac(fp_indice) as indice:
+        assert indice.consultar("52998224720")["apac"].tolist() == [primeira]
+
+    # nova geração: o índice devolve as mesmas APACs, sem gastar o pool
+    monkeypatch.undo()
+    _, _, primeira2, ultima2, _ = _gerar(ambiente, fp_cache=fp_cache, fp_indice=fp_indice)
+    assert (primeira2, ultima2) == (primeira, ultima)
+    assert len(apac_manager.NUMERACOES_APAC_MEMORIA) == len(BASES) - 3
+
+
+def test_falha_ao_confirmar_indice_nao_devolve_numeracao(ambiente, monkeypatch):
+    monkeypatch.setattr(IndiceApac, "confirmar", _falhar)
+    arquivo, total, primeira, ultima, _ = _gerar(ambiente, fp_indice=str(ambiente["tmp"] / "indice.db"))
+
+    assert os.path.exists(arquivo)
+    assert len(apac_manager.NUMERACOES_APAC_MEMORIA) == len(BASES) - total
+    apac_manager.inicializar_manager(ambiente["fp_num"])
+    assert not apac_manager.apac_disponivel(ultima)
@@ -1,5 +1,11 @@
+import re
+import codecs
+import unicodedata
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
+
 # ====================================================
 # CONSTANTES E FUNÇÕES GLOBAIS DE FORMATAÇÃO
 # ====================================================
@@ -72,6 +78,46 @@ def sanitize_alpha(value):
     return ''.join(c for c in s if c.isalpha() or c.isspace()).strip()
 
 
+class _TabelaAscii(dict):
+    """
+    Caractere (code point) -> exatamente um caractere ASCII: a letra base da
+    decomposição NFKD ("É" -> "E") ou, sem equivalente, um espaço. Assim a
+    largura dos registros se mantém. Caracteres fora da faixa pré-calculada
+    entram sob demanda.
+    """
+
+    def __missing__(self, cp):
+        if cp < 128:
+            return chr(cp)
+        ascii_ = [c for c in unicodedata.normalize("NFKD", chr(cp)) if c.isascii()]
+        self[cp] = ascii_[0] if ascii_ else " "
+        return self[cp]
+
+
+TABELA_ASCII = _TabelaAscii()
+
+# Latin-1 byte a byte: o texto é codificado em latin-1 e traduzido com
+# bytes.translate, tudo em C; só caracteres acima de U+00FF (raros) passam
+# pelo tratador de erro abaixo.
+_BYTES_ASCII = bytes(ord(TABELA_ASCII[cp]) for cp in range(256))
+
+
+def _transliterar_erro(exc):
+    trecho = exc.object[exc.start:exc.end]
+    return "".join(TABELA_ASCII[ord(c)] for c in trecho), exc.end
+
+
+codecs.register_error("transliterar_ascii", _transliterar_erro)
+
+
+def codificar_ascii(texto):
+    """
+    Texto (ou um buffer inteiro de registros) -> bytes ASCII, exatamente um
+    byte por caractere.
+    """
+    return texto.encode("latin-1", "transliterar_ascii").translate(_BYTES_ASCII)
+
+
 # ======================================
 # 🔧 FORMATADORES — agora com sanitização
 # ======================================
@@ -110,6 +156,121 @@ def formatar_char(valor, tamanho):
     return valor_sanit.ljust(tamanho)
 
 
+# ==========================================================
+# 🔧 FORMATADORES VETORIZADOS (pandas.Series inteiras)
+# ==========================================================
+# Mesma semântica de sanitize_basic/formatar_num/formatar_char, mas
+# aplicados a uma coluna inteira de uma vez. Saída idêntica byte a byte.
+
+# str.isdigit() aceita mais que \d (dígitos decimais): também sobrescritos,
+# subscritos, números circulados etc. (Numeric_Type=Digit), listados abaixo
+# por faixa para reproduzir exatamente sanitize_numeric sem varrer o Unicode.
+_DIGITOS_NAO_DECIMAIS = (
+    "\u00b2\u00b3\u00b9\u1369-\u1371\u19da\u2070\u2074-\u2079\u2080-\u2089"
+    "\u2460-\u2468\u2474-\u247c\u2488-\u2490\u24ea\u24f5-\u24fd\u24ff"
+    "\u2776-\u277e\u2780-\u2788\u278a-\u2792"
+    "\U00010a40-\U00010a43\U00010e60-\U00010e68\U00011052-\U0001105a\U0001f100-\U0001f10a"
+)
+_RE_NAO_DIGITO = re.compile(f"[^\\d{_DIGITOS_NAO_DECIMAIS}]")
+
+
+def sanitize_basic_serie(serie):
+    """
+    sanitize_basic aplicado a uma Series inteira.
+    """
+    valores = serie.astype(object)
+    texto = valores.astype(str).astype(object)
+    nulos = valores.isna()
+    if nulos.any():
+        texto[nulos] = ["" if v is None else str(v) for v in valores[nulos]]
+    return (
+        texto.str.replace("\x00", "", regex=False)
+             .str.replace(r"[\r\n\t]", " ", regex=True)
+             .str.strip()
+    )
+
+
+def formatar_num_serie(texto, tamanho):
+    """
+    formatar_num aplicado a uma Series de texto (já sanitizada).
+    """
+    return (
+        texto.str.replace(_RE_NAO_DIGITO, "", regex=True)
+             .str.slice(0, tamanho)
+             .str.pad(tamanho, side="left", fillchar="0")
+    )
+
+
+def formatar_char_serie(texto, tamanho):
+    """
+    formatar_char aplicado a uma Series de texto (já sanitizada).
+    """
+    return texto.str.slice(0, tamanho).str.pad(tamanho, side="right", fillchar=" ")
+
+
+# ============================
+# 🪪 VALIDAÇÃO DE CPF E CARTÃO SUS (em lote)
+# ============================
+# Cada coluna vira uma matriz de dígitos (uma linha por documento) e os
+# dígitos verificadores são calculados para todas as linhas de uma vez.
+
+_PESOS_CPF_DV1 = np.arange(10, 1, -1)
+_PESOS_CPF_DV2 = np.arange(11, 1, -1)
+_PESOS_CNS = np.arange(15, 0, -1)
+_INICIO_CNS = np.array([1, 2, 7, 8, 9])
+
+
+def _somente_digitos(serie):
+    if pd.api.types.is_float_dtype(serie):
+        # coluna numérica lida com vazios (ex.: 7.021027617e14): volta a inteiro
+        serie = serie.astype("Int64")
+    return serie.astype(str).str.replace(r"[^0-9]", "", regex=True)
+
+
+def matriz_digitos(serie, tamanho):
+    """
+    (matriz, completos): matriz inteira len(serie) x tamanho com os dígitos
+    de cada valor e máscara das linhas com exatamente `tamanho` dígitos
+    (as demais ficam zeradas na matriz).
+    """
+    texto = _somente_digitos(serie)
+    completos = (texto.str.len() == tamanho).to_numpy()
+    texto = texto.where(completos, "0" * tamanho)
+    brutos = np.frombuffer("".join(texto).encode("ascii"), dtype=np.uint8)
+    return (brutos.reshape(-1, tamanho) - ord("0")).astype(np.int64), completos
+
+
+def _dv_cpf(soma):
+    resto = soma % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+
+def validar_cpf_serie(serie):
+    """
+    Series booleana (mesmo índice): True onde o CPF tem 11 dígitos, não é
+    uma repetição do mesmo dígito e os dois verificadores (módulo 11) batem.
+    Pontuação é ignorada.
+    """
+    m, completos = matriz_digitos(serie, 11)
+    repetido = (m == m[:, :1]).all(axis=1)
+    dv1 = _dv_cpf(m[:, :9] @ _PESOS_CPF_DV1)
+    dv2 = _dv_cpf(m[:, :10] @ _PESOS_CPF_DV2)
+    validos = completos & ~repetido & (m[:, 9] == dv1) & (m[:, 10] == dv2)
+    return pd.Series(validos, index=serie.index)
+
+
+def validar_cns_serie(serie):
+    """
+    Series booleana (mesmo índice): True onde o Cartão SUS tem 15 dígitos,
+    começa com 1, 2, 7, 8 ou 9 e a soma ponderada (pesos 15 a 1) é
+    múltipla de 11 — regra que vale para os cartões definitivos (1/2) e
+    provisórios (7/8/9).
+    """
+    m, completos = matriz_digitos(serie, 15)
+    validos = completos & np.isin(m[:, 0], _INICIO_CNS) & ((m @ _PESOS_CNS) % 11 == 0)
+    return pd.Series(validos, index=serie.index)
+
+
 # ====================================================
 # LÓGICA DE NEGÓCIO (MAPAS E IDADE) - mantida para compatibilidade
 # ====================================================
@@ -159,8 +320,43 @@ def calcular_idade(data_nasc_str, data_consulta_str):
         return 0
 
 
+def calcular_idade_serie(nasc, cons, em_meses=False):
+    """
+    calcular_idade para colunas inteiras de datas AAAAMMDD: cada coluna é
+    convertida uma única vez (com cache para datas repetidas) e a idade sai
+    como uma coluna de inteiros, 0 onde alguma das datas é inválida.
+    Com em_meses, a idade é em meses completos (como no SIGTAP).
+    """
+    nasc = pd.Series(nasc)
+    dn = pd.to_datetime(nasc, format="%Y%m%d", errors="coerce", cache=True)
+    dc = pd.to_datetime(pd.Series(cons, index=nasc.index), format="%Y%m%d", errors="coerce", cache=True)
+    if em_meses:
+        antes_do_dia = (dc.dt.day < dn.dt.day).astype(int)
+        idade = (dc.dt.year - dn.dt.year) * 12 + dc.dt.month - dn.dt.month - antes_do_dia
+        return idade.fillna(0).astype(int)
+    antes_aniversario = (dc.dt.month * 100 + dc.dt.day) < (dn.dt.month * 100 + dn.dt.day)
+    idade = dc.dt.year - dn.dt.year - antes_aniversario.astype(int)
+    return idade.fillna(0).astype(int)
+
+
+# A partir desta idade o procedimento principal é o 090501003-5
+IDADE_CORTE_PROCEDIMENTO = 9
+
+
+def faixa_procedimento(idade):
+    """Chave em MAPA_PROCEDIMENTOS_OFTALMO do procedimento principal para a idade."""
+    return "090501003-5" if idade >= IDADE_CORTE_PROCEDIMENTO else "090501001-9"
+
+
+def faixa_procedimento_serie(idade):
+    """faixa_procedimento para uma coluna inteira de idades."""
+    return pd.Series(idade >= IDADE_CORTE_PROCEDIMENTO, index=idade.index).map(
+        {True: faixa_procedimento(IDADE_CORTE_PROCEDIMENTO), False: faixa_procedimento(0)}
+    ).astype(object)
+
+
 def selecionar_procedimento(idade):
-    return MAPA_PROCEDIMENTOS_OFTALMO["090501003-5"] if idade >= 9 else MAPA_PROCEDIMENTOS_OFTALMO["090501001-9"]
+    return MAPA_PROCEDIMENTOS_OFTALMO[faixa_procedimento(idade)]
 
 
 # ====================================================
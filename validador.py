@@ -0,0 +1,262 @@
+"""
+Leitura e conferência de uma remessa APAC já gravada (oci_oftalmo_*.txt).
+
+O arquivo é mapeado em memória (mmap) e percorrido em blocos, como um
+array de bytes do NumPy sobre o próprio mapeamento, sem cópia e sem
+quebrar em linhas no Python: os fins de registro (CRLF) são localizados
+de uma vez em cada bloco e as conferências rodam sobre todos os registros
+do bloco juntos. Arquivos de vários GB são auditados em segundos.
+
+Conferências:
+    - largura de cada registro conforme o tipo (01, 14, 06, 13) e CRLF no fim
+    - sequência dos tipos: 01 só no início, 14 -> 06 -> 13 [-> 13...] -> 14
+    - competência e número da APAC de cada registro iguais aos do
+      cabeçalho / do Registro 14 a que pertencem; APACs repetidas
+    - campos numéricos (APAC, procedimento, quantidade) só com dígitos
+    - quantidade de APACs e campo de controle do cabeçalho, recalculados:
+      (soma dos números das APACs + códigos e quantidades de todos os
+      Registros 13) % 1111 + 1111
+"""
+
+import mmap
+from collections import Counter
+
+import numpy as np
+
+from layout import (
+    LAYOUTS, LAYOUT_REGISTRO_01, LAYOUT_REGISTRO_13, LAYOUT_REGISTRO_14,
+    AcumuladorControle, campo_bytes, numeros_campo
+)
+
+TAMANHO_BLOCO = 64 << 20
+LIMITE_VIOLACOES = 1000
+
+_CR, _LF = 13, 10
+
+
+def _tipo(indicador):
+    return int.from_bytes(indicador.encode("ascii"), "big")
+
+
+TIPO_01, TIPO_06, TIPO_13, TIPO_14 = (_tipo(t) for t in ("01", "06", "13", "14"))
+
+# largura esperada (com CRLF) por tipo, indexada pelos 2 bytes do indicador
+_LARGURAS = np.zeros(1 << 16, dtype=np.int64)
+for _indicador, _layout in LAYOUTS.items():
+    _LARGURAS[_tipo(_indicador)] = _layout.tamanho
+
+# pares (anterior, atual) permitidos na sequência de registros
+_SEQUENCIAS = np.array([
+    (TIPO_01 << 16) | TIPO_14,
+    (TIPO_14 << 16) | TIPO_06,
+    (TIPO_06 << 16) | TIPO_13,
+    (TIPO_13 << 16) | TIPO_13,
+    (TIPO_13 << 16) | TIPO_14,
+], dtype=np.int64)
+
+_FATIA_APAC = LAYOUT_REGISTRO_14.fatia("apa_num")        # mesma posição em 06 e 13
+_FATIA_CMP = LAYOUT_REGISTRO_14.fatia("apa_cmp")         # idem
+_FATIA_COD = LAYOUT_REGISTRO_13.fatia("cod_proc")
+_FATIA_QTD = LAYOUT_REGISTRO_13.fatia("qtd")
+
+
+class RelatorioValidacao:
+    """Resultado de validar_remessa."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.tamanho = 0
+        self.registros = Counter()          # tipo ("01", "14"...) -> quantidade
+        self.competencia = ""
+        self.total_cabecalho = None
+        self.controle_cabecalho = ""
+        self.total_apacs = 0
+        self.controle_calculado = ""
+        self.violacoes = []                 # (registro nº, posição em bytes, mensagem)
+        self.contagem_violacoes = Counter()  # mensagem -> ocorrências
+
+    @property
+    def ok(self):
+        return not self.contagem_violacoes
+
+    def violacao(self, numero, posicao, mensagem):
+        self.contagem_violacoes[mensagem] += 1
+        if len(self.violacoes) < LIMITE_VIOLACOES:
+            self.violacoes.append((numero, posicao, mensagem))
+
+    def imprimir(self):
+        print(f"Arquivo: {self.caminho} ({self.tamanho} bytes)")
+        print("Registros: " + ", ".join(f"{t}={n}" for t, n in sorted(self.registros.items())))
+        print(f"Competência: {self.competencia or '-'}")
+        print(f"APACs: cabeçalho={self.total_cabecalho} contadas={self.total_apacs}")
+        print(f"Campo de controle: cabeçalho={self.controle_cabecalho or '-'} calculado={self.controle_calculado}")
+        if self.ok:
+            print("OK: nenhuma violação encontrada.")
+            return
+        print(f"{sum(self.contagem_violacoes.values())} violação(ões):")
+        for mensagem, n in self.contagem_violacoes.most_common():
+            print(f"  {n:>8}  {mensagem}")
+        print("Primeiras ocorrências (registro nº, byte):")
+        for numero, posicao, mensagem in sorted(self.violacoes)[:50]:
+            print(f"  {numero:>10} {posicao:>12}  {mensagem}")
+
+
+def _texto(matriz_linha):
+    return bytes(matriz_linha).decode("ascii", "replace")
+
+
+def _nome_tipo(tipo):
+    return "início" if tipo == 0 else _texto([tipo >> 8, tipo & 255])
+
+
+def _conferir_cabecalho(mm, rel):
+    cab = bytes(mm[:LAYOUT_REGISTRO_01.tamanho])
+    if cab[:7] != b"01#APAC" or cab[-2:] != b"\r\n":
+        rel.violacao(1, 0, "cabeçalho (Registro 01) ausente ou malformado")
+        return
+    texto = cab.decode("ascii", "replace")
+    rel.competencia = texto[LAYOUT_REGISTRO_01.fatia("competencia")]
+    total = texto[LAYOUT_REGISTRO_01.fatia("total_apacs")]
+    rel.total_cabecalho = int(total) if total.isdigit() else None
+    rel.controle_cabecalho = texto[LAYOUT_REGISTRO_01.fatia("campo_controle")]
+
+
+def validar_remessa(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    """Confere a remessa em `caminho` e devolve um RelatorioValidacao."""
+    rel = RelatorioValidacao(caminho)
+
+    with open(caminho, "rb") as f:
+        f.seek(0, 2)
+        rel.tamanho = f.tell()
+        if rel.tamanho == 0:
+            rel.violacao(0, 0, "arquivo vazio")
+            return rel
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        _conferir_cabecalho(mm, rel)
+        cmp_cabecalho = np.frombuffer(rel.competencia.encode("ascii", "replace"), dtype=np.uint8)
+
+        controle = AcumuladorControle()
+        apacs = []
+        numero_base = 0        # registros já vistos em blocos anteriores
+        tipo_anterior = 0      # 0 = início do arquivo
+        apac_corrente = None   # bytes do número da APAC do último Registro 14
+        inicio = 0
+
+        bloco = tamanho_bloco
+        while inicio < rel.tamanho:
+            fim = min(inicio + bloco, rel.tamanho)
+            a = np.frombuffer(mm, dtype=np.uint8, count=fim - inicio, offset=inicio)
+
+            crs = np.flatnonzero(a[:-1] == _CR)
+            finais = crs[a[crs + 1] == _LF]
+            if len(finais) == 0:
+                del a
+                if fim == rel.tamanho:
+                    rel.violacao(numero_base + 1, inicio, "dados após o último CRLF")
+                    break
+                # registro maior que o bloco: amplia o bloco e relê
+                bloco *= 2
+                continue
+            bloco = tamanho_bloco
+
+            inicios = np.concatenate(([0], finais[:-1] + 2))
+            larguras = finais + 2 - inicios
+            tipos = (a[inicios].astype(np.int64) << 8) | a[np.minimum(inicios + 1, len(a) - 1)]
+            n = len(inicios)
+            numeros = numero_base + 1 + np.arange(n)
+
+            # largura por tipo
+            esperadas = _LARGURAS[tipos]
+            for i in np.flatnonzero(larguras != esperadas):
+                tipo = _texto(a[inicios[i]:inicios[i] + 2])
+                if esperadas[i] == 0:
+                    rel.violacao(int(numeros[i]), inicio + int(inicios[i]), f"tipo de registro desconhecido: {tipo!r}")
+                else:
+                    rel.violacao(int(numeros[i]), inicio + int(inicios[i]),
+                                 f"Registro {tipo} com {int(larguras[i])} bytes (esperado {int(esperadas[i])})")
+            # registros de tipo conhecido; os de largura errada ainda entram nas
+            # demais conferências se contêm ao menos competência e APAC
+            conhecidos = esperadas > 0
+            legiveis = conhecidos & (larguras >= np.where(tipos == TIPO_13, _FATIA_QTD.stop, _FATIA_APAC.stop))
+
+            # sequência de tipos
+            anteriores = np.concatenate(([tipo_anterior], tipos[:-1]))
+            pares = (anteriores << 16) | tipos
+            fora = ~np.isin(pares, _SEQUENCIAS) & conhecidos
+            if numero_base == 0:
+                fora[0] = tipos[0] != TIPO_01
+            for i in np.flatnonzero(fora):
+                rel.violacao(int(numeros[i]), inicio + int(inicios[i]),
+                             f"sequência inválida: {_nome_tipo(int(anteriores[i]))} -> {_nome_tipo(int(tipos[i]))}")
+
+            for indicador in LAYOUTS:
+                rel.registros[indicador] += int(np.count_nonzero(tipos == _tipo(indicador)))
+
+            # competência e APAC de cada registro (14, 06, 13)
+            corpo = legiveis & (tipos != TIPO_01)
+            ini_corpo = inicios[corpo]
+            num_corpo = numeros[corpo]
+            if len(ini_corpo):
+                cmps = campo_bytes(a, ini_corpo, _FATIA_CMP)
+                for i in np.flatnonzero((cmps != cmp_cabecalho).any(axis=1))[:LIMITE_VIOLACOES]:
+                    rel.violacao(int(num_corpo[i]), inicio + int(ini_corpo[i]),
+                                 "competência diferente da do cabeçalho")
+
+                num_apacs = campo_bytes(a, ini_corpo, _FATIA_APAC)
+                eh_14 = tipos[corpo] == TIPO_14
+                # APAC a que cada registro pertence: a do último Registro 14
+                dono = np.where(eh_14, np.arange(len(ini_corpo)), -1)
+                dono = np.maximum.accumulate(dono)
+                if apac_corrente is None:
+                    apac_corrente = np.zeros(_FATIA_APAC.stop - _FATIA_APAC.start, dtype=np.uint8)
+                governante = np.where((dono >= 0)[:, None], num_apacs[np.maximum(dono, 0)], apac_corrente)
+                for i in np.flatnonzero((num_apacs != governante).any(axis=1) & ~eh_14)[:LIMITE_VIOLACOES]:
+                    rel.violacao(int(num_corpo[i]), inicio + int(ini_corpo[i]),
+                                 "número da APAC diferente do Registro 14 correspondente")
+                if eh_14.any():
+                    apac_corrente = num_apacs[np.flatnonzero(eh_14)[-1]].copy()
+
+                valores, validos = numeros_campo(num_apacs[eh_14])
+                for i in np.flatnonzero(~validos):
+                    j = np.flatnonzero(eh_14)[i]
+                    rel.violacao(int(num_corpo[j]), inicio + int(ini_corpo[j]), "número da APAC não numérico")
+                apacs.append(valores[validos])
+                controle.somar_numeros(valores)
+
+                eh_13 = tipos[corpo] == TIPO_13
+                ini_13 = ini_corpo[eh_13]
+                if len(ini_13):
+                    cods, cods_ok = numeros_campo(campo_bytes(a, ini_13, _FATIA_COD))
+                    qtds, qtds_ok = numeros_campo(campo_bytes(a, ini_13, _FATIA_QTD))
+                    for i in np.flatnonzero(~(cods_ok & qtds_ok)):
+                        rel.violacao(int(num_corpo[eh_13][i]), inicio + int(ini_13[i]),
+                                     "procedimento/quantidade não numérico no Registro 13")
+                    controle.somar_numeros(cods)
+                    controle.somar_numeros(qtds)
+
+            tipo_anterior = int(tipos[-1])
+            numero_base += n
+            inicio += int(finais[-1]) + 2
+            del a
+
+        if tipo_anterior not in (TIPO_13, TIPO_01):
+            rel.violacao(numero_base, rel.tamanho, "arquivo termina no meio de uma APAC (último registro não é 13)")
+
+        todas = np.concatenate(apacs) if apacs else np.zeros(0, dtype=np.int64)
+        rel.total_apacs = rel.registros["14"]
+        unicas, contagens = np.unique(todas, return_counts=True)
+        for apac in unicas[contagens > 1][:LIMITE_VIOLACOES]:
+            rel.violacao(0, 0, f"APAC repetida: {int(apac):013d}")
+
+        rel.controle_calculado = controle.campo()
+        if rel.total_cabecalho is not None and rel.total_cabecalho != rel.total_apacs:
+            rel.violacao(1, 0, f"cabeçalho informa {rel.total_cabecalho} APACs, arquivo tem {rel.total_apacs}")
+        if rel.controle_cabecalho and rel.controle_cabecalho != rel.controle_calculado:
+            rel.violacao(1, 0, f"campo de controle do cabeçalho ({rel.controle_cabecalho}) "
+                               f"difere do calculado ({rel.controle_calculado})")
+    finally:
+        mm.close()
+
+    return rel